@@ -1,10 +1,17 @@
 import streamlit as st
 import pandas as pd
 import plotly.io as pio
-from scripts.update_data import update_ohlcv_data, update_cot_reports
-from scripts.chart_COT import create_cot_figure, load_data
+from scripts.chart_COT import create_cot_figure
 from scripts.chart_calc import create_crush_spread_oil_share_figure
 from scripts.chart_lightweight import lightweight_chart_page
+from scripts.contracts import ROLL_RULES
+from scripts.data_layer import (load_continuous_bars, load_continuous_cot_asof, load_contracts, load_cot_asof, load_live,
+                                load_live_cot_asof, load_live_crush, load_timeframe, load_years, live_version,
+                                year_range_view, COT_DATASET, CRUSH_DATASET, OHLCV_DATASETS)
+from scripts.figure_cache import cached_figure
+from scripts.resample import EXCHANGE_TZ, derivable_timeframes
+from scripts.scheduler import get_scheduler
+from scripts.storage import dataset_version
 from streamlit_option_menu import option_menu
 from lightweight_charts.widgets import StreamlitChart
 
@@ -120,13 +127,7 @@ custom_template = {
 
 # Registrar o template personalizado
 pio.templates['custom_template'] = custom_template
-
-def load_ohlcv_data():
-    # Function to load data from parquet files
-    zs_data = pd.read_parquet('data/ZS_1D.parquet')
-    zl_data = pd.read_parquet('data/ZL_1D.parquet')
-    zm_data = pd.read_parquet('data/ZM_1D.parquet')
-    return zs_data, zl_data, zm_data
+THEME = 'custom_template'
 
 def checklist():
     st.sidebar.write('<style>div[data-testid="column"]:nth-child(2) div, div[data-testid="column"]:nth-child(3) div, div[data-testid="column"]:nth-child(4) div {text-align: center;}</style>', unsafe_allow_html=True)
@@ -156,6 +157,20 @@ def checklist():
 
     return df
 
+def render_update_status(status):
+    state = status.get('state', 'idle')
+    if state in ('queued', 'running'):
+        st.sidebar.info(f"Updating data ({state})...")
+    elif state == 'succeeded':
+        finished = pd.Timestamp(status['finished_at'], unit='s', tz='UTC').tz_convert(EXCHANGE_TZ)
+        st.sidebar.success(f"Data updated at {finished:%b %d %H:%M} CT")
+    elif state == 'failed':
+        # Última linha do traceback: a exceção
+        st.sidebar.error("Last update failed: " + (status.get('error') or '').strip().splitlines()[-1])
+    if status.get('next_run'):
+        next_run = pd.Timestamp(status['next_run']).tz_convert(EXCHANGE_TZ)
+        st.sidebar.caption(f"Next scheduled update: {next_run:%a %b %d %H:%M} CT")
+
 def render_sidebar():
     # Menu de navegação usando streamlit-option-menu
     with st.sidebar:
@@ -176,6 +191,9 @@ def render_sidebar():
     st.sidebar.header("Inputs")
     year_range = st.sidebar.slider("Select Year Range", min_value=2013, max_value=2024, value=(2021, 2024))
     start_year, end_year = year_range
+
+    # Barras do TradingView em tempo real por cima das guardadas; o stream só abre quando ligado
+    live = st.sidebar.toggle("Live bars", value=False, help="Mostra as últimas barras de ZS1!, ZL1! e ZM1! em tempo real")
     
     # Adicionar espaço antes do botão
     st.sidebar.markdown("<br><br>", unsafe_allow_html=True)
@@ -190,73 +208,83 @@ def render_sidebar():
     update_button_placeholder = st.sidebar.empty()
     
     # Button to update data in the sidebar
+    # A atualização roda no agendador em segundo plano; o rerun só enfileira e mostra o estado
+    scheduler = get_scheduler()
     with update_button_placeholder.container():
         if st.sidebar.button("Update Data", key="update_button", help="Clique para atualizar os dados"):
-            update_ohlcv_data()
-            update_cot_reports()
-            st.sidebar.success("Data updated successfully!")
-            # Recarregar os dados após a atualização
-            zs_data, zl_data, zm_data = load_ohlcv_data()
-            cot_data = load_data()
-        else:
-            # Carregar os dados inicialmente
-            zs_data, zl_data, zm_data = load_ohlcv_data()
-            cot_data = load_data()
-    
-    return page, start_year, end_year, zs_data, zl_data, zm_data, cot_data
+            if not scheduler.trigger(reason='manual'):
+                st.sidebar.info("An update is already queued or running.")
+        render_update_status(scheduler.status())
 
-def home(start_year, end_year, zs_data, zl_data, zm_data, cot_data):
-    # Convert index to datetime if not already
-    zs_data.index = pd.to_datetime(zs_data.index)
-    zl_data.index = pd.to_datetime(zl_data.index)
-    zm_data.index = pd.to_datetime(zm_data.index)
-    cot_data.index = pd.to_datetime(cot_data.index)
-    
-    # Filter data by date range
-    zs_filtered = zs_data[(zs_data.index.year >= start_year) & (zs_data.index.year <= end_year)]
-    zl_filtered = zl_data[(zl_data.index.year >= start_year) & (zl_data.index.year <= end_year)]
-    zm_filtered = zm_data[(zm_data.index.year >= start_year) & (zm_data.index.year <= end_year)]
-    cot_filtered = cot_data[(cot_data.index.year >= start_year) & (cot_data.index.year <= end_year)]
+    # Cada página carrega só o que exibe, do cache compartilhado, que recarrega sozinho quando uma
+    # atualização muda a versão no manifesto
+    return page, start_year, end_year, live
+
+def home(start_year, end_year, live=False):
+    # Figuras reaproveitadas enquanto dados, período e tema não mudam
+    cot_key = ('cot', dataset_version(COT_DATASET), start_year, end_year, THEME)
+    crush_key = ('crush_spread_oil_share', dataset_version(CRUSH_DATASET), start_year, end_year, THEME)
+    if live:
+        crush_key += (live_version(),)
     
     # Dividir a tela em duas colunas
     col1, col2 = st.columns(2)
     
     with col1:
         # Display COT chart
-        st.plotly_chart(create_cot_figure(cot_filtered), use_container_width=True)
+        # Só os anos do período são lidos do disco
+        cot_figure = cached_figure(cot_key, lambda: create_cot_figure(load_years(COT_DATASET, start_year, end_year)))
+        st.plotly_chart(cot_figure, use_container_width=True)
     
     with col2:
         # Display Crush Spread and Oil Share chart
-        st.plotly_chart(create_crush_spread_oil_share_figure(zs_filtered, zl_filtered, zm_filtered), use_container_width=True)
+        if live:
+            # Série com as barras ao vivo das pernas, recortada em memória
+            load_crush = lambda: year_range_view(load_live_crush(), start_year, end_year)[['crush_spread', 'oil_share']]
+        else:
+            load_crush = lambda: load_years(CRUSH_DATASET, start_year, end_year, columns=['crush_spread', 'oil_share'])
+        crush_figure = cached_figure(crush_key, lambda: create_crush_spread_oil_share_figure(load_crush()))
+        st.plotly_chart(crush_figure, use_container_width=True)
         
         # Adicionar espaço vertical reduzido entre o gráfico e a checklist
         st.markdown("<div style='margin-top: -20px;'></div>", unsafe_allow_html=True)
 
 def main():
     # Renderizar a barra lateral
-    page, start_year, end_year, zs_data, zl_data, zm_data, cot_data = render_sidebar()
+    page, start_year, end_year, live = render_sidebar()
 
     if page == "Home":
-        home(start_year, end_year, zs_data, zl_data, zm_data, cot_data)
+        home(start_year, end_year, live)
     elif page == "OHLCV":
         # Adicionar selectbox para selecionar o símbolo
         symbol = st.radio("Select:", options=["ZS", "ZL", "ZM"],horizontal=True, label_visibility='collapsed')
 
-        # Selecionar os dados de acordo com o símbolo escolhido
-        if symbol == "ZS":
-            selected_data = zs_data
-        elif symbol == "ZL":
-            selected_data = zl_data
-        elif symbol == "ZM":
-            selected_data = zm_data
+        # Intervalos montados localmente a partir das barras guardadas, sem nova consulta ao TradingView
+        base_interval = OHLCV_DATASETS[symbol].rsplit('_', 1)[-1]
+        interval = st.radio("Interval:", options=derivable_timeframes(base_interval), horizontal=True,
+                            label_visibility='collapsed')
 
-        # Filtrar os dados pelo intervalo de tempo selecionado
-        cot_data2 = cot_data.reindex(selected_data.index, method='ffill')
-        selected_data = selected_data[(selected_data.index.year >= start_year) & (selected_data.index.year <= end_year)]
-        cot_data2 = cot_data2[(cot_data2.index.year >= start_year) & (cot_data2.index.year <= end_year)]
+        # Com vencimentos guardados, a série contínua ajustada pelas regras de rolagem é uma alternativa ao 1!
+        series = '1!'
+        if load_contracts(symbol):
+            series = st.radio("Series:", options=['1!', *ROLL_RULES], horizontal=True, label_visibility='collapsed')
+
+        # Selecionar os dados de acordo com o símbolo e o intervalo escolhidos, com o COT alinhado às
+        # barras respeitando a data de publicação, calculado uma vez por versão dos dados
+        if series != '1!':
+            selected_data = load_continuous_bars(symbol, interval, series)
+            cot_data2 = load_continuous_cot_asof(symbol, interval, series)
+        elif live:
+            # Últimas barras do stream por cima das guardadas; o gráfico recebe só as que mudaram
+            selected_data = load_live(OHLCV_DATASETS[symbol], interval)
+            cot_data2 = load_live_cot_asof(OHLCV_DATASETS[symbol], interval=interval)
+        else:
+            selected_data = load_timeframe(OHLCV_DATASETS[symbol], interval)
+            cot_data2 = load_cot_asof(OHLCV_DATASETS[symbol], interval=interval)
 
-        # Chamar a função lightweight_chart_page com os dados filtrados
-        lightweight_chart_page(selected_data, cot_data2, symbol=symbol)
+        # O gráfico fica na sessão e recebe só as barras novas; o período selecionado vira a faixa visível
+        lightweight_chart_page(selected_data, cot_data2, symbol=symbol, interval=interval, series=series,
+                               start=pd.Timestamp(start_year, 1, 1), end=pd.Timestamp(end_year + 1, 1, 1))
 
 # Exemplo de uso
 if __name__ == "__main__":
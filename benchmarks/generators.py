@@ -0,0 +1,116 @@
+import hashlib
+import io
+import os
+import sys
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# Adiciona o caminho da raiz do projeto ao sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.cot_cache import _blob_path, save_entry
+from scripts.update_data import COT_COLUMNS, MARKET_CODES
+from tvdatafeed_lib.fake import frame, message
+
+# Todos os geradores são determinísticos: a mesma semente produz sempre os mesmos dados e bytes.
+# Acima de ~100 mil barras diárias as datas passam do limite do pandas (2262), então os
+# benchmarks usam freq='min' nas séries longas.
+SEED = 0
+LAST_BAR = 1718917200
+
+def _random_walk(n, seed, start=1000.0, step=0.002):
+    rng = np.random.default_rng(seed)
+    return start * np.exp(np.cumsum(rng.normal(0.0, step, n)))
+
+def ohlcv_frame(n_bars, freq='min', seed=SEED, start='2000-01-03'):
+    """Barras OHLCV sintéticas com índice 'datetime', no formato dos datasets de data/"""
+    rng = np.random.default_rng(seed)
+    close = _random_walk(n_bars, seed)
+    open_ = np.r_[close[0], close[:-1]]
+    spread = np.abs(rng.normal(0.0, 0.001, n_bars)) * close
+    index = pd.date_range(start, periods=n_bars, freq=freq, name='datetime')
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.integers(100, 100_000, n_bars).astype(np.float64),
+    }, index=index)
+
+def legs_frames(n_bars, freq='D', seed=SEED):
+    """Barras de ZS, ZL e ZM nas mesmas datas, em escalas próximas às de cada contrato"""
+    legs = []
+    for i, scale in enumerate([1.0, 0.045, 0.33]):
+        df = ohlcv_frame(n_bars, freq, seed + i)
+        df[['open', 'high', 'low', 'close']] *= scale
+        legs.append(df)
+    return tuple(legs)
+
+def cot_frame(n_rows, freq='W-TUE', seed=SEED, start='1990-01-02'):
+    """Série de COT % (como cot_soybean_products) com n_rows relatórios, semanais por padrão"""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start, periods=n_rows, freq=freq, name='datetime')
+    values = np.clip(np.cumsum(rng.normal(0.0, 1.5, (n_rows, 3)), axis=0), -60, 60)
+    return pd.DataFrame(np.round(values, 1), index=index, columns=['ZL_COT_%', 'ZM_COT_%', 'ZS_COT_%'])
+
+def tv_bars(n_bars, seed=SEED, interval_seconds=60, end=LAST_BAR):
+    """Barras [ts, o, h, l, c, v] como o TradingView envia em timescale_update"""
+    df = ohlcv_frame(n_bars, seed=seed)
+    values = np.round(df[['open', 'high', 'low', 'close', 'volume']].to_numpy(), 2)
+    times = end - (n_bars - 1 - np.arange(n_bars, dtype=np.float64)) * interval_seconds
+    return np.column_stack([times, values]).tolist()
+
+def tv_wire_payload(n_bars, series_id='s1', chart_session='cs_bench', seed=SEED):
+    """Frame do websocket com a série inteira, como o recebido por TvDatafeed"""
+    points = [{'i': i, 'v': bar} for i, bar in enumerate(tv_bars(n_bars, seed))]
+    return (
+        frame('~h~1')
+        + message('timescale_update', [chart_session, {series_id: {'node': 'bench', 's': points, 't': series_id}}])
+        + message('series_completed', [chart_session, series_id, 'streaming'])
+    )
+
+def cftc_year_csv(n_rows, year=2020, seed=SEED, extra_columns=40):
+    """Relatório anual da CFTC (legacy) compactado como no site: um .txt CSV dentro do zip
+
+    As linhas se dividem entre os três mercados de soja e outros códigos, e extra_columns colunas
+    numéricas completam a largura do arquivo real, que a leitura deve descartar.
+    """
+    rng = np.random.default_rng(seed)
+    other_codes = [f'{code:06d}' for code in range(100001, 100001 + 300)]
+    codes = np.array(list(MARKET_CODES.values()) + other_codes)
+    weeks = pd.date_range(f'{year}-01-07', periods=52, freq='W-TUE')
+
+    long_pct = np.round(rng.uniform(5, 40, n_rows), 1)
+    short_pct = np.round(rng.uniform(5, 40, n_rows), 1)
+    data = {
+        COT_COLUMNS[0]: np.repeat('SYNTHETIC MARKET - CHICAGO BOARD OF TRADE', n_rows),
+        COT_COLUMNS[1]: weeks[np.arange(n_rows) % len(weeks)].strftime('%Y-%m-%d'),
+        COT_COLUMNS[2]: rng.integers(0, 300_000, n_rows),
+        COT_COLUMNS[3]: rng.integers(0, 300_000, n_rows),
+        COT_COLUMNS[4]: rng.integers(-20_000, 20_000, n_rows),
+        COT_COLUMNS[5]: rng.integers(-20_000, 20_000, n_rows),
+        COT_COLUMNS[6]: long_pct,
+        COT_COLUMNS[7]: short_pct,
+        'CFTC Contract Market Code': codes[np.arange(n_rows) % len(codes)],
+    }
+    for i in range(extra_columns):
+        data[f'Extra Column {i}'] = rng.integers(0, 100_000, n_rows)
+
+    text = pd.DataFrame(data).to_csv(index=False)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as z:
+        # Data fixa no zip para que os bytes não dependam do momento da geração
+        z.writestr(zipfile.ZipInfo('annual.txt', date_time=(year, 1, 1, 0, 0, 0)), text, zipfile.ZIP_DEFLATED)
+    return buffer.getvalue()
+
+def write_cot_cache(cache_dir, content, year=2020, cot_report_type='legacy_fut'):
+    """Coloca content no cache de scripts/cot_cache como se tivesse sido baixado, para leitura offline"""
+    digest = hashlib.sha256(content).hexdigest()
+    path = _blob_path(cache_dir, digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    save_entry({'sha256': digest, 'fetched_at': time.time(), 'url': 'synthetic'}, year, cot_report_type, cache_dir)
@@ -0,0 +1,298 @@
+"""Benchmarks dos caminhos críticos, com dados sintéticos e sem acesso à rede.
+
+    python benchmarks/run.py                       # compara com benchmarks/baselines.json
+    python benchmarks/run.py --sizes 1000,100000 --cases tv_parse,cot_figure
+    python benchmarks/run.py --full                # inclui 10 milhões de barras
+    python benchmarks/run.py --save                # grava os resultados como nova referência
+"""
+import argparse
+import functools
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+# Adiciona o caminho da raiz do projeto ao sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generators import (cftc_year_csv, cot_frame, legs_frames, ohlcv_frame, tv_wire_payload,
+                                   write_cot_cache)
+from scripts.chart_COT import create_cot_figure
+from scripts.chart_calc import create_crush_spread_oil_share_figure
+from scripts.cot_cache import read_cot_year
+from scripts.derived import compute_derived_series
+from scripts.storage import read_dataset, write_dataset
+from scripts.update_data import COT_COLUMNS, MARKET_CODES, calculate_cot, process_cot_data
+from tvdatafeed_lib.fake import FakeTvServer
+from tvdatafeed_lib.main import Interval, TvDatafeed
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+FULL_SIZES = SIZES + [10_000_000]
+
+# Tempo acima de REGRESSION_RATIO vezes a referência conta como regressão. Nos casos de poucos
+# milissegundos a razão sozinha mede ruído do sistema, então o tempo também precisa passar da
+# referência por REGRESSION_TOLERANCE segundos
+REGRESSION_RATIO = 1.3
+REGRESSION_TOLERANCE = 0.015
+
+# Execuções medidas: pelo menos --repeat, e mais enquanto a soma não chega a MIN_MEASURE_SECONDS
+# (até MAX_RUNS), para os casos rápidos terem amostras suficientes para o melhor tempo
+REPEAT = 5
+MIN_MEASURE_SECONDS = 0.25
+MAX_RUNS = 100
+
+# Cada caso recebe o tamanho e um diretório temporário, monta as entradas fora da medição e devolve
+# a função medida, que retorna o payload produzido (str/bytes); qualquer outro valor não conta como
+# payload. max_size limita os casos cujo gerador ou formato não escala até 10 milhões de linhas.
+CASES = {}
+
+def case(name, max_size=None):
+    def register(setup):
+        CASES[name] = {'setup': setup, 'max_size': max_size}
+        return setup
+    return register
+
+@case('tv_parse')
+def tv_parse(n, workdir):
+    # Frames do websocket -> pacotes -> JSON -> DataFrame, como TvDatafeed faz ao receber uma série
+    payload = tv_wire_payload(n)
+    split_frames = TvDatafeed._TvDatafeed__split_frames
+    create_df = TvDatafeed._TvDatafeed__create_df
+
+    def run():
+        points = []
+        for packet in split_frames(payload):
+            if packet.startswith('~h~'):
+                continue
+            data = json.loads(packet)
+            if data['m'] == 'timescale_update':
+                points.extend(data['p'][1]['s1']['s'])
+        create_df(points, 'CBOT:ZS1!')
+        return payload
+    return run
+
+@case('tv_get_hist', max_size=1_000_000)
+def tv_get_hist(n, workdir):
+    # Protocolo completo contra o servidor falso: handshake, pedido, leitura e DataFrame
+    server = FakeTvServer(bars=n)
+    # Barras de 1 minuto: 1 milhão de barras diárias passaria do limite de datas do pandas
+    fetch = functools.partial(TvDatafeed(ws_factory=server.connect).get_hist, 'ZS1!', 'CBOT',
+                              interval=Interval.in_1_minute, n_bars=n)
+    fetch()  # gera o histórico sintético do servidor fora da medição
+
+    def run():
+        fetch()
+    return run
+
+@case('cot_extract', max_size=1_000_000)
+def cot_extract(n, workdir):
+    # Leitura do zip anual em cache, filtro dos mercados de soja e cálculo do COT %
+    cache_dir = os.path.join(workdir, 'cot_cache')
+    content = cftc_year_csv(n)
+    write_cot_cache(cache_dir, content, 2020)
+
+    def run():
+        df = read_cot_year(2020, cache_dir=cache_dir, columns=COT_COLUMNS, market_codes=MARKET_CODES.values())
+        for cot_type, commodity_df in process_cot_data(df).items():
+            calculate_cot(commodity_df, cot_type)
+        return content
+    return run
+
+def _stored_bars(n, workdir, compact=False):
+    df = ohlcv_frame(n)
+    write_dataset('BENCH_1', df, data_dir=workdir, compact=compact)
+    return df
+
+@case('load_full')
+def load_full(n, workdir):
+    _stored_bars(n, workdir)
+    return lambda: read_dataset('BENCH_1', data_dir=workdir)
+
+@case('load_window')
+def load_window(n, workdir):
+    # Um mês de fechamentos no meio do histórico: o custo deve acompanhar a janela, não o total
+    df = _stored_bars(n, workdir)
+    start = df.index[len(df) // 2]
+    end = start + pd.Timedelta(days=30)
+    return lambda: read_dataset('BENCH_1', data_dir=workdir, start=start, end=end, columns=['close'])
+
+@case('load_full_compact')
+def load_full_compact(n, workdir):
+    _stored_bars(n, workdir, compact=True)
+    return lambda: read_dataset('BENCH_1', data_dir=workdir)
+
+@case('crush_derived')
+def crush_derived(n, workdir):
+    legs = legs_frames(n, 'min')
+    return lambda: compute_derived_series(*legs)
+
+@case('crush_figure')
+def crush_figure(n, workdir):
+    derived = compute_derived_series(*legs_frames(n, 'min'))
+    # to_json faz parte da medição: é o que o cache de figuras guarda e o navegador recebe
+    return lambda: create_crush_spread_oil_share_figure(derived).to_json()
+
+@case('cot_figure')
+def cot_figure(n, workdir):
+    df = cot_frame(n, 'min')
+    return lambda: create_cot_figure(df).to_json()
+
+@case('lightweight_chart')
+def lightweight_chart(n, workdir):
+    # Depende de streamlit e lightweight_charts (com pywebview); sem eles o caso é pulado
+    try:
+        from scripts.chart_lightweight import ChartState
+    except ImportError:
+        return None
+    data = ohlcv_frame(n)
+    cot = cot_frame(n, 'min', start=data.index[0])
+
+    def run():
+        state = ChartState('ZS')
+        state.sync(data, cot)
+        return state.chart._html
+    return run
+
+def _payload_bytes(payload):
+    # Só str/bytes têm tamanho em bytes; casos que devolvem DataFrames não têm payload
+    if isinstance(payload, str):
+        return len(payload.encode())
+    if isinstance(payload, bytes):
+        return len(payload)
+    return None
+
+def measure(run, repeat=REPEAT, min_seconds=MIN_MEASURE_SECONDS):
+    """Melhor tempo entre as execuções, pico de memória (Python + NumPy) e bytes do payload"""
+    run()  # aquecimento: imports tardios e caches do primeiro uso ficam fora da medição
+    times = []
+    payload = None
+    while len(times) < repeat or (sum(times) < min_seconds and len(times) < MAX_RUNS):
+        gc.collect()
+        started = time.perf_counter()
+        payload = run()
+        times.append(time.perf_counter() - started)
+
+    # Execução separada para a memória: o tracemalloc deixa o código mais lento
+    gc.collect()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(times), 'runs': len(times), 'peak_bytes': peak, 'payload_bytes': _payload_bytes(payload)}
+
+def run_benchmarks(cases, sizes, repeat):
+    results = {}
+    for name in cases:
+        spec = CASES[name]
+        for n in sizes:
+            if spec['max_size'] is not None and n > spec['max_size']:
+                continue
+            with tempfile.TemporaryDirectory(prefix='bench_') as workdir:
+                run = spec['setup'](n, workdir)
+                if run is None:
+                    print(f'{name:<18} {n:>10,}  skipped (optional dependency missing)')
+                    break
+                result = measure(run, repeat)
+            result['rows_per_second'] = n / result['seconds'] if result['seconds'] else None
+            results.setdefault(name, {})[str(n)] = result
+            print(f"{name:<18} {n:>10,}  {result['seconds']:9.4f}s", flush=True)
+    return results
+
+def load_baselines(path=BASELINE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'results': {}}
+
+def save_baselines(results, path=BASELINE_PATH):
+    # Mescla com a referência existente: casos e tamanhos não executados agora são mantidos
+    baselines = load_baselines(path)
+    for name, by_size in results.items():
+        baselines['results'].setdefault(name, {}).update(by_size)
+    baselines['machine'] = {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+    }
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+def compare(results, baselines, ratio=REGRESSION_RATIO, tolerance=REGRESSION_TOLERANCE):
+    """Linhas do relatório e a lista de regressões (tempo acima de ratio vezes a referência e de
+    referência + tolerance segundos, ou payload diferente)"""
+    header = f"{'case':<18} {'size':>10} {'seconds':>10} {'baseline':>10} {'ratio':>7} {'peak MB':>9} {'payload KB':>11}  status"
+    lines = [header, '-' * len(header)]
+    regressions = []
+    for name, by_size in results.items():
+        for size, result in by_size.items():
+            reference = baselines['results'].get(name, {}).get(size)
+            status = 'new'
+            baseline_seconds = speed = ''
+            if reference is not None:
+                speed_ratio = result['seconds'] / reference['seconds'] if reference['seconds'] else float('inf')
+                baseline_seconds = f"{reference['seconds']:.4f}"
+                speed = f'{speed_ratio:.2f}'
+                status = 'ok'
+                if speed_ratio > ratio and result['seconds'] > reference['seconds'] + tolerance:
+                    status = 'REGRESSION'
+                if result['payload_bytes'] != reference.get('payload_bytes'):
+                    status = 'PAYLOAD CHANGED' if status == 'ok' else status + ', PAYLOAD CHANGED'
+                if status != 'ok':
+                    regressions.append((name, size, status))
+            payload = '' if result['payload_bytes'] is None else f"{result['payload_bytes'] / 1024:.1f}"
+            lines.append(f"{name:<18} {int(size):>10,} {result['seconds']:>10.4f} {baseline_seconds:>10} {speed:>7} "
+                         f"{result['peak_bytes'] / 2 ** 20:>9.1f} {payload:>11}  {status}")
+    return lines, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cases', default=','.join(CASES), help='casos separados por vírgula')
+    parser.add_argument('--sizes', default=None, help='tamanhos separados por vírgula (padrão: 1k a 1M)')
+    parser.add_argument('--full', action='store_true', help='inclui 10 milhões de linhas')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='execuções medidas no mínimo')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--ratio', type=float, default=REGRESSION_RATIO)
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help='segundos acima da referência abaixo dos quais não há regressão')
+    parser.add_argument('--save', action='store_true', help='grava os resultados como referência')
+    parser.add_argument('--json', help='grava os resultados brutos neste arquivo')
+    parser.add_argument('--strict', action='store_true', help='sai com código 1 se houver regressões')
+    args = parser.parse_args(argv)
+    # O aviso de login anônimo do TvDatafeed se repetiria a cada execução do servidor falso
+    logging.getLogger('tvdatafeed_lib.main').setLevel(logging.ERROR)
+
+    cases = [name.strip() for name in args.cases.split(',') if name.strip()]
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)} (available: {', '.join(CASES)})")
+    sizes = [int(size) for size in args.sizes.split(',')] if args.sizes else FULL_SIZES if args.full else SIZES
+
+    results = run_benchmarks(cases, sizes, args.repeat)
+    lines, regressions = compare(results, load_baselines(args.baseline), args.ratio, args.tolerance)
+    print()
+    print('\n'.join(lines))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.save:
+        save_baselines(results, args.baseline)
+        print(f"\nBaselines saved to '{args.baseline}'")
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) against the baseline')
+        if args.strict:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
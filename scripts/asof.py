@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+# O COT traz as posições de terça-feira e é publicado na sexta às 15:30 (horário de Nova York).
+# Uma barra só pode ver o relatório depois da publicação, senão o backtest usa informação do futuro.
+COT_RELEASE_LAG = pd.Timedelta(days=3, hours=15, minutes=30)
+COT_RELEASE_TZ = 'America/New_York'
+
+def asof_join(index, df, release_lag=COT_RELEASE_LAG):
+    """Para cada timestamp de index, a última linha de df já disponível (data + release_lag <= timestamp)
+
+    df precisa de índice ordenado, com as datas dos relatórios sem fuso. Antes do primeiro relatório
+    disponível o resultado é NaN. Com index em UTC, a publicação é convertida do horário de Nova York.
+    """
+    available_at = df.index + release_lag
+    if pd.DatetimeIndex(index).tz is not None:
+        available_at = available_at.tz_localize(COT_RELEASE_TZ).tz_convert('UTC')
+    positions = np.searchsorted(available_at.values, pd.DatetimeIndex(index).values, side='right') - 1
+
+    values = df.to_numpy(dtype=np.float64)
+    result = np.full((len(positions), values.shape[1]), np.nan)
+    found = positions >= 0
+    result[found] = values[positions[found]]
+    return pd.DataFrame(result, index=index, columns=df.columns)
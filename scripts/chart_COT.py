@@ -1,9 +1,15 @@
 import os
-import pandas as pd
-import plotly.graph_objs as go
+import sys
 from plotly.subplots import make_subplots
 import plotly.io as pio
 
+# Adiciona o caminho da raiz do projeto ao sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.storage import read_dataset
+from scripts.chart_traces import line_trace, level_line
+from scripts.downsample import LINE_POINT_BUDGET
+
 # Definir o template personalizado
 custom_template = {
     'layout': {
@@ -49,12 +55,10 @@ custom_template = {
 pio.templates['custom_template'] = custom_template
 
 def load_data():
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    parquet_path = os.path.join(script_dir, '..', 'data', 'cot_soybean_products.parquet')
-    df_COT = pd.read_parquet(parquet_path)
+    df_COT = read_dataset('cot_soybean_products')
     return df_COT
 
-def create_cot_figure(df_COT):
+def create_cot_figure(df_COT, max_points=LINE_POINT_BUDGET):
     max_ZS = df_COT['ZS_COT_%'].max()
     min_ZS = df_COT['ZS_COT_%'].min()
     max_ZL = df_COT['ZL_COT_%'].max()
@@ -64,83 +68,16 @@ def create_cot_figure(df_COT):
 
     fig = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.02)
 
-    fig.add_trace(go.Scatter(
-        x=df_COT.index, 
-        y=df_COT['ZS_COT_%'], 
-        mode='lines', 
-        name='ZS_COT_%', 
-        line=dict(color='#089981'), 
-        hoverinfo='text',  # Use 'text' to control hover info
-        hovertext=['{:.1f}%<br>{:%b %d, %y}'.format(y, x) for x, y in zip(df_COT.index, df_COT['ZS_COT_%'])]
-    ), row=1, col=1)
-    
-    fig.add_trace(go.Scatter(
-        x=df_COT.index, 
-        y=df_COT['ZL_COT_%'], 
-        mode='lines', 
-        name='ZL_COT_%', 
-        line=dict(color='#fb8c00'), 
-        hoverinfo='text',  # Use 'text' to control hover info
-        hovertext=['{:.1f}%<br>{:%b %d, %y}'.format(y, x) for x, y in zip(df_COT.index, df_COT['ZL_COT_%'])]
-    ), row=2, col=1)
-    
-    fig.add_trace(go.Scatter(
-        x=df_COT.index, 
-        y=df_COT['ZM_COT_%'], 
-        mode='lines', 
-        name='ZM_COT_%', 
-        line=dict(color='#f23645'), 
-        hoverinfo='text',  # Use 'text' to control hover info
-        hovertext=['{:.1f}%<br>{:%b %d, %y}'.format(y, x) for x, y in zip(df_COT.index, df_COT['ZM_COT_%'])]
-    ), row=3, col=1)
+    fig.add_trace(line_trace(df_COT.index, df_COT['ZS_COT_%'], 'ZS_COT_%', '#089981', '.1f', '%', max_points), row=1, col=1)
+    fig.add_trace(line_trace(df_COT.index, df_COT['ZL_COT_%'], 'ZL_COT_%', '#fb8c00', '.1f', '%', max_points), row=2, col=1)
+    fig.add_trace(line_trace(df_COT.index, df_COT['ZM_COT_%'], 'ZM_COT_%', '#f23645', '.1f', '%', max_points), row=3, col=1)
 
-    fig.add_trace(go.Scatter(
-        x=[df_COT.index[0], df_COT.index[-1]], 
-        y=[max_ZS, max_ZS], 
-        mode='lines', 
-        line=dict(dash='dot', color='#9598a1'), 
-        showlegend=False
-    ), row=1, col=1)
-    
-    fig.add_trace(go.Scatter(
-        x=[df_COT.index[0], df_COT.index[-1]], 
-        y=[min_ZS, min_ZS], 
-        mode='lines', 
-        line=dict(dash='dot', color='#9598a1'), 
-        showlegend=False
-    ), row=1, col=1)
-    
-    fig.add_trace(go.Scatter(
-        x=[df_COT.index[0], df_COT.index[-1]], 
-        y=[max_ZL, max_ZL], 
-        mode='lines', 
-        line=dict(dash='dot', color='#9598a1'), 
-        showlegend=False
-    ), row=2, col=1)
-    
-    fig.add_trace(go.Scatter(
-        x=[df_COT.index[0], df_COT.index[-1]], 
-        y=[min_ZL, min_ZL], 
-        mode='lines', 
-        line=dict(dash='dot', color='#9598a1'), 
-        showlegend=False
-    ), row=2, col=1)
-    
-    fig.add_trace(go.Scatter(
-        x=[df_COT.index[0], df_COT.index[-1]], 
-        y=[max_ZM, max_ZM], 
-        mode='lines', 
-        line=dict(dash='dot', color='#9598a1'), 
-        showlegend=False
-    ), row=3, col=1)
-    
-    fig.add_trace(go.Scatter(
-        x=[df_COT.index[0], df_COT.index[-1]], 
-        y=[min_ZM, min_ZM], 
-        mode='lines', 
-        line=dict(dash='dot', color='#9598a1'), 
-        showlegend=False
-    ), row=3, col=1)
+    fig.add_trace(level_line(df_COT.index, max_ZS), row=1, col=1)
+    fig.add_trace(level_line(df_COT.index, min_ZS), row=1, col=1)
+    fig.add_trace(level_line(df_COT.index, max_ZL), row=2, col=1)
+    fig.add_trace(level_line(df_COT.index, min_ZL), row=2, col=1)
+    fig.add_trace(level_line(df_COT.index, max_ZM), row=3, col=1)
+    fig.add_trace(level_line(df_COT.index, min_ZM), row=3, col=1)
 
     fig.update_layout(
         height=800, 
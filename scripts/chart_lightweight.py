@@ -1,58 +1,242 @@
 from lightweight_charts.widgets import StreamlitChart
+from streamlit.components.v1 import html
+import json
+import numpy as np
 import pandas as pd
 import streamlit as st
+import os
+import sys
 
-def lightweight_chart_page(data, cot_data, symbol='ZS', interval='1D', markup=None):
-    # st.title("OHLCV Lightweight Chart")
+# Adiciona o caminho da raiz do projeto ao sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.data_layer import date_range_view
+from scripts.downsample import CANDLE_POINT_BUDGET, MARKER_BUDGET, downsample_line, downsample_ohlc, select_markers
+
+def epoch_seconds(index):
+    # Mesmo horário em segundos que chart.set usa para os candles
+    return index.values.astype('datetime64[s]').astype(np.int64)
+
+def markers_script(chart, bars, signals, max_markers=MARKER_BUDGET):
+    """Comando JS que desenha os sinais 'up'/'down' de signals sobre os candles de bars"""
+    positions, up = select_markers(signals, bars.index, max_markers)
+    times = epoch_seconds(bars.index[positions])
+    markers = [
+        {'time': int(time), 'position': 'belowBar', 'color': '#2196F3', 'shape': 'arrowUp', 'text': 'up'}
+        if is_up else
+        {'time': int(time), 'position': 'aboveBar', 'color': '#ffbf00', 'shape': 'arrowDown', 'text': 'down'}
+        for time, is_up in zip(times.tolist(), up.tolist())
+    ]
+    return f'{chart.id}.markers = {json.dumps(markers)}; {chart.id}.series.setMarkers({chart.id}.markers)'
+
+def set_markers(chart, bars, signals, max_markers=MARKER_BUDGET):
+    chart.run_script(markers_script(chart, bars, signals, max_markers))
+
+def update_script(chart, line, bars, cot):
+    """Comando JS que envia bars e os valores de cot nas mesmas datas pelo fim do gráfico
+
+    chart.update arredonda o horário para o intervalo mais comum visto em chart.set, o que desloca
+    as barras semanais e mensais; aqui vai o horário em segundos de epoch_seconds, como em chart.set.
+    """
+    times = epoch_seconds(bars.index).tolist()
+    candles = [
+        {'time': time, 'open': open_, 'high': high, 'low': low, 'close': close}
+        for time, open_, high, low, close in zip(times, *(bars[column].tolist() for column in ['open', 'high', 'low', 'close']))
+    ]
+    volume = [] if 'volume' not in bars else [
+        {'time': candle['time'], 'value': value,
+         'color': chart._volume_up_color if candle['close'] > candle['open'] else chart._volume_down_color}
+        for candle, value in zip(candles, bars['volume'].tolist())
+    ]
+    cot = cot.reindex(bars.index)
+    points = [{'time': time, 'value': value} for time, value in zip(times, cot.tolist()) if not pd.isna(value)]
+
+    # data acompanha a série (legenda e lastBar): a última barra é substituída se tiver o mesmo horário
+    # Sem espaços: o comando fica no HTML reenviado a cada rerun
+    push = ('for(const b of {bars}){{if({id}.data.length&&lastBar({id}.data).time===b.time)'
+            '{id}.data[{id}.data.length-1]=b;else {id}.data.push(b);{id}.series.update(b)}}')
+    compact = {'separators': (',', ':')}
+    return ';'.join([
+        push.format(id=chart.id, bars=json.dumps(candles, **compact)),
+        f'for(const b of {json.dumps(volume, **compact)}){chart.id}.volumeSeries.update(b)',
+        push.format(id=line.id, bars=json.dumps(points, **compact)),
+    ])
+
+# Barras novas enviadas com update_script; acima disso o gráfico é refeito com chart.set
+UPDATE_LIMIT = 500
+
+class SessionChart(StreamlitChart):
+    """StreamlitChart que pode ser exibido de novo a cada rerun, com a faixa visível aplicada por último"""
+    visible_range = ''
+
+    def _load(self):
+        html(f'{self._html}\n{self.visible_range}</script></body></html>', width=self.width, height=self.height)
+
+    def show(self):
+        if self.win.loaded:
+            self._load()
+        else:
+            self.load()
+
+class ChartState:
+    """Gráfico de candles + COT de uma sessão, atualizado com as barras novas entre reruns"""
+
+    def __init__(self, symbol, markup=None, max_points=CANDLE_POINT_BUDGET, max_line_points=CANDLE_POINT_BUDGET,
+                 max_markers=MARKER_BUDGET):
+        self.symbol = symbol
+        self.markup = markup
+        self.max_points = max_points
+        self.max_line_points = max_line_points
+        self.max_markers = max_markers
+        self.chart = None
+        self.bars = None
+        self.aggregated = False
+        # Período [start, end) enviado ao gráfico; None enquanto não há gráfico montado
+        self.span = None
+        # Primeira, última e número de barras do período enviado, e a última barra, para detectar reruns sem mudança
+        self.window_key = None
+        self.last_bar = None
+        # Tamanho do HTML e número de barras do último chart.set, para estimar o de um gráfico refeito
+        self.build_bytes = 0
+        self.build_bars = 0
+
+    def _build(self):
+        # Utilização de lightweight-charts
+        chart = SessionChart(width=1300, height=700, inner_width=1,
+                             inner_height=0.7, toolbox=False)
 
-    # Utilização de lightweight-charts
-    chart = StreamlitChart(width=1300, height=700, inner_width=1,
-                           inner_height=0.7, toolbox=False)
-
-    chart.legend(visible=True, font_size=12)
-    chart.layout(background_color='#181c27', text_color='#b2b5be',
-                 font_size=12, font_family='Century Gothic')
-    chart.candle_style(up_color='#089981', down_color='#f23645', border_up_color='#089981', border_down_color='#f23645',
-                       wick_up_color='#089981', wick_down_color='#f23645')
-    chart.volume_config(up_color='#11443c', down_color='#5b2928')
-    chart.price_line(line_visible=False)
-    chart.fit()
-
-    # Markups, se houver
-    if markup is not None:
-        for idx, row in data.iterrows():
-            if row[markup] == 'up':
-                chart.marker(time=row.name, position='below',
-                             shape='arrow_up', color='#2196F3', text='up')
-            elif row[markup] == 'down':
-                chart.marker(time=row.name, position='above',
-                             shape='arrow_down', color='#ffbf00', text='down')
-
-    # Columns: | time | open | high | low | close | volume |
-    chart.set(data)
-
-    # Adicionar linha azul para o COT correspondente
-    cot_column = f"{symbol}_COT_%"
-    cot_series = cot_data[[cot_column]].reset_index()
-    cot_series.columns = ['time', f'{symbol} COT %']
-
-    chart2 = chart.create_subchart(
-        position='bottom', width=0.992, height=0.3, sync=True)
-    chart2.layout(background_color='#131722', text_color='#b2b5be',
-                  font_size=12, font_family='Century Gothic')
-    chart2.legend(visible=True, percent=True, lines=True, font_size=12)
-    line = chart2.create_line(f'{symbol} COT %', price_label=True, price_line=False, color='#fb8c00')
-
-    chart2.set()
-    line.set(cot_series)
-
-    # Adicionar linha horizontal em 0
-    zero_line = pd.DataFrame({'time': cot_series['time'], 'zero': 0})
-    zero_line_series = chart2.create_line('zero', color='#9598a1', width=1, style='solid', price_label=False, price_line=False)
-    zero_line_series.set(zero_line)
+        chart.legend(visible=True, font_size=12)
+        chart.layout(background_color='#181c27', text_color='#b2b5be',
+                     font_size=12, font_family='Century Gothic')
+        chart.candle_style(up_color='#089981', down_color='#f23645', border_up_color='#089981', border_down_color='#f23645',
+                           wick_up_color='#089981', wick_down_color='#f23645')
+        chart.volume_config(up_color='#11443c', down_color='#5b2928')
+        chart.price_line(line_visible=False)
+
+        chart2 = chart.create_subchart(
+            position='bottom', width=0.992, height=0.3, sync=True)
+        chart2.layout(background_color='#131722', text_color='#b2b5be',
+                      font_size=12, font_family='Century Gothic')
+        chart2.legend(visible=True, percent=True, lines=True, font_size=12)
+        self.line = chart2.create_line(f'{self.symbol} COT %', price_label=True, price_line=False, color='#fb8c00')
+        chart2.set()
+
+        # Linha horizontal em 0 nativa do gráfico, sem uma série com um ponto por barra
+        chart2.horizontal_line(0, color='#9598a1', width=1, style='solid', axis_label_visible=False)
+        self.chart = chart
+
+    def _pending(self, window):
+        """Barras de window a enviar com update (vazio se nada mudou), ou None se o gráfico deve ser refeito"""
+        if self.bars is None or len(window) > self.max_points or len(window) > self.max_line_points:
+            return None
+        shipped = self.bars.index
+        n = len(shipped)
+        if self.aggregated or len(window) < n or window.index[0] != shipped[0] or window.index[n - 1] != shipped[-1]:
+            return None
+        if len(window) - n + 1 > UPDATE_LIMIT:
+            return None
+
+        # A última barra enviada é reenviada junto com as novas, pois pode ter sido revisada
+        tail = window.iloc[n - 1:]
+        if len(tail) == 1 and tail.equals(self.bars.iloc[-1:]):
+            return tail.iloc[:0]
+        return tail
+
+    def _covers(self, start, end):
+        # None é aberto: sem início/fim, o período vai até a ponta do histórico
+        if self.span is None:
+            return False
+        shipped_start, shipped_end = self.span
+        return ((shipped_start is None or (start is not None and shipped_start <= start))
+                and (shipped_end is None or (end is not None and end <= shipped_end)))
+
+    def sync(self, data, cot_data, start=None, end=None):
+        """Envia ao gráfico as barras de data no período [start, end), refazendo-o só quando não dá
+        para atualizar pelo fim
+
+        Só o período é enviado. Se ele cabe no período já enviado, o gráfico não é refeito: muda só
+        a faixa visível, e as barras novas no fim do período enviado vão por update_bars.
+        """
+        candles = data.drop(columns=[self.markup]) if self.markup in data else data
+        if not self._covers(start, end):
+            self.span = (start, end)
+        window = date_range_view(candles, *self.span)
+        if window.empty:
+            self._build()
+            self.bars = None
+            self.span = None
+            return
+
+        # Mesmo período e mesma última barra: nada a enviar, nem com o histórico agregado
+        window_key = (window.index[0], window.index[-1], len(window))
+        if self.bars is not None and window_key == self.window_key and window.iloc[-1:].equals(self.last_bar):
+            self._show_range(start, end)
+            return
+        self.window_key, self.last_bar = window_key, window.iloc[-1:]
+
+        cot = cot_data[f"{self.symbol}_COT_%"].loc[window.index[0]:window.index[-1]].rename(f'{self.symbol} COT %')
+        signals = None if self.markup is None else data[self.markup].loc[window.index[0]:window.index[-1]]
+
+        tail = self._pending(window)
+        script = ''
+        if tail is not None and len(tail):
+            # O StreamlitChart reenvia todo o HTML a cada rerun, com os comandos acumulados desde o
+            # chart.set; quando ele passaria do tamanho de um gráfico refeito, refazer sai mais barato
+            script = update_script(self.chart, self.line, tail, cot)
+            if signals is not None:
+                script += '\n' + markers_script(self.chart, window, signals, self.max_markers)
+            if len(self.chart._html) + len(script) > self.build_bytes * len(window) / self.build_bars:
+                tail = None
+
+        if tail is None:
+            self._build()
+            # Históricos longos são agregados em candles maiores (OHLC preservado)
+            bars = downsample_ohlc(window, self.max_points)
+            self.aggregated = len(bars) < len(window)
+            # Columns: | time | open | high | low | close | volume |
+            self.chart.set(bars)
+            cot_series = downsample_line(cot, self.max_line_points).to_frame().reset_index()
+            cot_series.columns = ['time', f'{self.symbol} COT %']
+            self.line.set(cot_series)
+            # Markups, se houver: todos os marcadores enviados de uma vez, nas barras que os contêm
+            if signals is not None:
+                set_markers(self.chart, bars, signals, self.max_markers)
+            self.build_bytes, self.build_bars = len(self.chart._html), len(window)
+        else:
+            bars = window
+            if script:
+                self.chart.run_script(script)
+        self.bars = bars
+        self._show_range(start, end)
+
+    def _show_range(self, start, end):
+        if start is None and end is None:
+            self.chart.visible_range = f'{self.chart.id}.chart.timeScale().fitContent()'
+        else:
+            visible = date_range_view(self.bars, start, end)
+            if len(visible):
+                first, last = epoch_seconds(visible.index[[0, -1]]).tolist()
+                self.chart.visible_range = f'{self.chart.id}.chart.timeScale().setVisibleRange({{from: {first}, to: {last}}})'
+
+def session_chart(symbol, interval='1D', markup=None, series='1!', **kwargs):
+    # Um gráfico por símbolo/intervalo/série na sessão: alternar entre ZS, ZL e ZM reaproveita o já montado
+    charts = st.session_state.setdefault('lightweight_charts', {})
+    key = (symbol, interval, markup, series)
+    if key not in charts:
+        charts[key] = ChartState(symbol, markup, **kwargs)
+    return charts[key]
+
+def lightweight_chart_page(data, cot_data, symbol='ZS', interval='1D', markup=None, series='1!', start=None, end=None,
+                           max_points=CANDLE_POINT_BUDGET, max_line_points=CANDLE_POINT_BUDGET,
+                           max_markers=MARKER_BUDGET):
+    # st.title("OHLCV Lightweight Chart")
+    # O subgráfico do COT é sincronizado com os candles, então usa o mesmo orçamento de pontos
+    state = session_chart(symbol, interval, markup, series, max_points=max_points, max_line_points=max_line_points,
+                          max_markers=max_markers)
+    state.sync(data, cot_data, start, end)
 
     # Exibir o gráfico no Streamlit
-    chart.load()
+    state.chart.show()
 
 # Exemplo de uso
 if __name__ == "__main__":
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+
+from scripts.downsample import LINE_POINT_BUDGET, lttb_indices
+
+# Formato do hover: valor e data como '12.3%<br>Jun 11, 24', montado no navegador pelo
+# hovertemplate a partir de x/y, sem gerar uma string Python por ponto
+HOVER_DATE = '%{x|%b %d, %y}'
+
+def hovertemplate(value_format='.2f', suffix=''):
+    return '%{y:' + value_format + '}' + suffix + '<br>' + HOVER_DATE + '<extra></extra>'
+
+def plot_dates(x):
+    # O Plotly não tem fusos: índices em UTC vão como horário UTC sem fuso (as barras diárias caem
+    # às 00:00 ou 01:00 UTC da data do pregão, então o hover mostra a data certa)
+    if isinstance(x, pd.DatetimeIndex) and x.tz is not None:
+        return x.tz_convert('UTC').tz_localize(None)
+    return x
+
+def line_trace(x, y, name, color, value_format='.2f', suffix='', max_points=LINE_POINT_BUDGET):
+    # Séries longas são reduzidas por LTTB antes de ir para o navegador
+    x = plot_dates(x)
+    if max_points is not None and len(y) > max_points:
+        selected = lttb_indices(np.asarray(x), np.asarray(y), max_points)
+        x = np.asarray(x)[selected]
+        y = np.asarray(y)[selected]
+
+    return go.Scatter(
+        x=x,
+        y=y,
+        mode='lines',
+        name=name,
+        line=dict(color=color),
+        hovertemplate=hovertemplate(value_format, suffix)
+    )
+
+def level_line(x, value):
+    # Linha pontilhada horizontal (máximo/mínimo) entre o primeiro e o último ponto de x
+    x = plot_dates(x)
+    return go.Scatter(
+        x=[x[0], x[-1]],
+        y=[value, value],
+        mode='lines',
+        line=dict(dash='dot', color='#9598a1'),
+        showlegend=False
+    )
@@ -0,0 +1,131 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from scripts.resample import trading_dates
+
+# Meses de vencimento listados na CBOT (código do mês no símbolo do contrato)
+MONTH_CODES = 'FGHJKMNQUVXZ'
+CONTRACT_MONTHS = {
+    'ZS': 'FHKNQUX',
+    'ZL': 'FHKNQUVZ',
+    'ZM': 'FHKNQUVZ'
+}
+
+# Regras de rolagem: 'calendar' troca de contrato days_before pregões antes do primeiro dia do mês
+# de entrega (antes do first notice day); 'volume' troca quando o próximo contrato negocia mais.
+# adjustment 'back' soma a diferença de preço na rolagem ao histórico, 'ratio' multiplica, None não ajusta.
+ROLL_RULES = {
+    'first_notice': {'method': 'calendar', 'days_before': 5, 'adjustment': 'back'},
+    'first_notice_ratio': {'method': 'calendar', 'days_before': 5, 'adjustment': 'ratio'},
+    'volume': {'method': 'volume', 'days_before': 1, 'adjustment': 'back'},
+    'unadjusted': {'method': 'calendar', 'days_before': 5, 'adjustment': None},
+}
+
+def contract_label(year, code):
+    # Mesmo formato das colunas '<perna>_<mês>' de scripts/spreads.expand_by_month, ex.: '2024N'
+    return f'{year}{code}'
+
+def contract_dataset(root, label, interval='1D'):
+    return f'{root}_{label}_{interval}'
+
+def contract_symbol(root, label):
+    # Símbolo do TradingView: raiz + código do mês + ano, ex.: 'ZSN2024'
+    return f'{root}{label[4:]}{label[:4]}'
+
+def listed_contracts(root, start_year, end_year):
+    return [contract_label(year, code) for year in range(start_year, end_year + 1) for code in CONTRACT_MONTHS[root]]
+
+def stored_contracts(root, names, interval='1D'):
+    """Rótulos dos contratos de root entre os datasets em names (ex.: as chaves do manifesto)"""
+    pattern = re.compile(rf'^{root}_(\d{{4}}[{MONTH_CODES}])_{interval}$')
+    labels = [match.group(1) for match in map(pattern.match, names) if match]
+    return sorted(labels, key=delivery_month)
+
+def delivery_month(label):
+    return pd.Timestamp(int(label[:4]), MONTH_CODES.index(label[4]) + 1, 1)
+
+def last_trade_date(label):
+    # Soja, farelo e óleo param de negociar no dia útil anterior ao dia 15 do mês de entrega
+    return pd.Timestamp(np.busday_offset((delivery_month(label) + pd.Timedelta(days=14)).date(), -1, roll='forward'))
+
+def roll_dates(labels, days_before):
+    """Último pregão de cada contrato na série contínua: days_before dias úteis antes do mês de entrega"""
+    first_days = np.array([delivery_month(label) for label in labels], dtype='datetime64[D]')
+    return np.busday_offset(first_days, -days_before, roll='forward')
+
+def contract_panel(contracts, field=None):
+    """Contratos lado a lado (na ordem de vencimento), alinhados pela data de negociação
+
+    Sem field, as colunas são (contrato, campo); com field, uma coluna por contrato, no formato
+    aceito por scripts/spreads.pairwise_spreads para os calendar spreads.
+    """
+    frames = {}
+    for label in sorted(contracts, key=delivery_month):
+        df = contracts[label].set_axis(trading_dates(contracts[label].index))
+        frames[label] = df[~df.index.duplicated(keep='last')]
+    panel = pd.concat(frames, axis=1).sort_index()
+    return panel if field is None else panel.xs(field, axis=1, level=1)
+
+def _active_contract(labels, dates, volume, rule):
+    # Índice (na ordem de vencimento) do contrato usado em cada data, para todas as datas de uma vez
+    last_days = roll_dates(labels, rule['days_before'])
+    by_calendar = np.searchsorted(last_days, dates.values.astype('datetime64[D]'), side='left')
+    if rule['method'] == 'calendar':
+        return np.minimum(by_calendar, len(labels) - 1)
+
+    # Por volume: o contrato mais negociado entre os que ainda não passaram da data limite,
+    # sem nunca voltar para um contrato anterior
+    eligible = np.arange(len(labels))[None, :] >= by_calendar[:, None]
+    traded = np.where(eligible, np.nan_to_num(volume, nan=-1.0), -np.inf)
+    return np.maximum.accumulate(np.argmax(traded, axis=1))
+
+def continuous_series(contracts, rule=ROLL_RULES['first_notice']):
+    """Série contínua, indexada pela data de negociação, montada a partir dos contratos individuais
+    ({rótulo: DataFrame OHLCV})
+
+    Todas as datas e contratos são processados juntos em matrizes (datas x contratos). Com ajuste,
+    o histórico anterior a cada rolagem é deslocado ('back') ou escalado ('ratio') pela diferença
+    entre o contrato novo e o antigo no último pregão do antigo, eliminando o salto da rolagem.
+    """
+    labels = sorted(contracts, key=delivery_month)
+    fields = ['open', 'high', 'low', 'close', 'volume']
+    panel = contract_panel(contracts)
+    panels = {field: panel.xs(field, axis=1, level=1).reindex(columns=labels).to_numpy(dtype=np.float64)
+              for field in fields}
+    dates = panel.index
+
+    active = _active_contract(labels, dates, panels['volume'], rule)
+    rows = np.arange(len(dates))
+    prices = {field: panels[field][rows, active] for field in fields}
+
+    # Rolagens: posição do último pregão do contrato antigo e os dois contratos envolvidos
+    last = np.flatnonzero(active[1:] != active[:-1])
+    old, new = active[last], active[last + 1]
+    close = panels['close']
+
+    adjustment = rule['adjustment']
+    if adjustment == 'back':
+        gaps = np.nan_to_num(close[last, new] - close[last, old])
+        offsets = np.zeros(len(dates))
+        offsets[last] = gaps
+        # Cada data recebe a soma das diferenças de todas as rolagens posteriores a ela
+        offsets = np.cumsum(offsets[::-1])[::-1]
+        for field in ['open', 'high', 'low', 'close']:
+            prices[field] = prices[field] + offsets
+    elif adjustment == 'ratio':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = close[last, new] / close[last, old]
+        factors = np.ones(len(dates))
+        factors[last] = np.where(np.isfinite(ratios), ratios, 1.0)
+        factors = np.cumprod(factors[::-1])[::-1]
+        for field in ['open', 'high', 'low', 'close']:
+            prices[field] = prices[field] * factors
+
+    df = pd.DataFrame(prices, index=dates)
+    df['contract'] = np.asarray(labels, dtype=object)[active]
+    # Datas sem cotação do contrato ativo (antes da listagem, feriados isolados) ficam de fora
+    df = df[~np.isnan(df['close'].to_numpy())]
+    df.index.name = 'datetime'
+    return df
@@ -0,0 +1,147 @@
+import hashlib
+import io
+import json
+import os
+import time
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+import requests
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'cot_cache')
+COT_URL = 'https://cftc.gov/files/dea/history/{}{}.zip'
+
+# Prefixo do arquivo anual de cada tipo de relatório (mesmos nomes usados pelo cot_reports)
+REPORT_PREFIXES = {
+    'legacy_fut': 'deacot',
+    'legacy_futopt': 'deahistfo',
+    'supplemental_futopt': 'dea_cit_txt_',
+    'disaggregated_fut': 'fut_disagg_txt_',
+    'disaggregated_futopt': 'com_disagg_txt_',
+    'traders_in_financial_futures_fut': 'fut_fin_txt_',
+    'traders_in_financial_futures_futopt': 'com_fin_txt_',
+}
+
+# Linhas lidas por bloco quando o relatório é filtrado por mercado
+CHUNK_ROWS = 50_000
+
+# Arquivos do ano corrente são republicados toda semana pela CFTC, na sexta às 15:30 (Nova York)
+MAX_AGE_SECONDS = 12 * 3600
+RELEASE_TZ = 'America/New_York'
+RELEASE_WEEKDAY = 4
+RELEASE_TIME = pd.Timedelta(hours=15, minutes=30)
+
+def _entry_path(cache_dir, cot_report_type, year):
+    return os.path.join(cache_dir, 'index', f'{cot_report_type}_{year}.json')
+
+def _blob_path(cache_dir, digest):
+    return os.path.join(cache_dir, 'blobs', f'{digest}.zip')
+
+# Uma entrada por arquivo, para que processos paralelos não sobrescrevam o índice uns dos outros
+def load_entry(year, cot_report_type='legacy_fut', cache_dir=CACHE_DIR):
+    try:
+        with open(_entry_path(cache_dir, cot_report_type, year)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_entry(entry, year, cot_report_type='legacy_fut', cache_dir=CACHE_DIR):
+    path = _entry_path(cache_dir, cot_report_type, year)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(entry, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def referenced_digests(cache_dir=CACHE_DIR):
+    index_dir = os.path.join(cache_dir, 'index')
+    digests = set()
+    for name in os.listdir(index_dir) if os.path.isdir(index_dir) else []:
+        if name.endswith('.json'):
+            with open(os.path.join(index_dir, name)) as f:
+                digests.add(json.load(f)['sha256'])
+    return digests
+
+def is_final(year, now=None):
+    # O arquivo de um ano só é definitivo depois das correções de janeiro do ano seguinte
+    now = now or datetime.now()
+    return year < now.year - (1 if now.month == 1 else 0)
+
+def last_release(now=None):
+    """Horário (epoch) da última publicação semanal do COT até now (epoch)"""
+    now = pd.Timestamp(time.time() if now is None else now, unit='s', tz='UTC').tz_convert(RELEASE_TZ)
+    day = now.normalize()
+    release = day - pd.Timedelta(days=(day.dayofweek - RELEASE_WEEKDAY) % 7) + RELEASE_TIME
+    if release > now:
+        release -= pd.Timedelta(days=7)
+    return release.timestamp()
+
+def is_fresh(entry, year, max_age=MAX_AGE_SECONDS, now=None):
+    if entry is None:
+        return False
+    now = time.time() if now is None else now
+    if is_final(year, datetime.fromtimestamp(now)):
+        return True
+    # Um download de antes da última publicação não tem o relatório dela, por mais recente que seja
+    return entry['fetched_at'] >= last_release(now) and now - entry['fetched_at'] < max_age
+
+def fetch_cot_archive(year, cot_report_type='legacy_fut', cache_dir=CACHE_DIR, max_age=MAX_AGE_SECONDS):
+    """Retorna o zip anual da CFTC, baixando só se o cache não estiver válido"""
+    entry = load_entry(year, cot_report_type, cache_dir)
+
+    if is_fresh(entry, year, max_age) and os.path.exists(_blob_path(cache_dir, entry['sha256'])):
+        with open(_blob_path(cache_dir, entry['sha256']), 'rb') as f:
+            return f.read()
+
+    url = COT_URL.format(REPORT_PREFIXES[cot_report_type], year)
+    response = requests.get(url)
+    response.raise_for_status()
+    content = response.content
+
+    # Blobs são endereçados pelo conteúdo: um novo download idêntico não duplica o arquivo
+    digest = hashlib.sha256(content).hexdigest()
+    blob_path = _blob_path(cache_dir, digest)
+    if not os.path.exists(blob_path):
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        tmp_path = f'{blob_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, blob_path)
+
+    save_entry({'sha256': digest, 'fetched_at': time.time(), 'url': url}, year, cot_report_type, cache_dir)
+
+    # Remover blobs que nenhuma entrada referencia mais
+    if entry is not None and entry['sha256'] != digest:
+        if entry['sha256'] not in referenced_digests(cache_dir):
+            try:
+                os.remove(_blob_path(cache_dir, entry['sha256']))
+            except FileNotFoundError:
+                pass
+
+    return content
+
+def read_cot_year(year, cot_report_type='legacy_fut', cache_dir=CACHE_DIR, columns=None, market_codes=None,
+                  code_column='CFTC Contract Market Code'):
+    """Lê o relatório anual direto do zip em cache, sem extrair arquivos no disco
+
+    columns limita as colunas decodificadas e market_codes mantém só as linhas
+    desses códigos de mercado da CFTC, filtrando bloco a bloco durante a leitura.
+    """
+    content = fetch_cot_archive(year, cot_report_type, cache_dir)
+    usecols = None
+    if columns is not None:
+        usecols = list(dict.fromkeys(list(columns) + ([code_column] if market_codes else [])))
+
+    with zipfile.ZipFile(io.BytesIO(content)) as z:
+        txt = next(name for name in z.namelist() if name.lower().endswith('.txt'))
+        with z.open(txt) as f:
+            if market_codes is None:
+                return pd.read_csv(f, usecols=usecols, low_memory=False)
+
+            market_codes = set(market_codes)
+            chunks = [
+                chunk[chunk[code_column].str.strip().isin(market_codes)]
+                for chunk in pd.read_csv(f, usecols=usecols, dtype={code_column: str}, chunksize=CHUNK_ROWS)
+            ]
+            return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,275 @@
+import threading
+
+import pandas as pd
+
+from scripts.asof import COT_RELEASE_LAG, asof_join
+from scripts.contracts import ROLL_RULES, contract_dataset, continuous_series, stored_contracts
+from scripts.derived import CRUSH_DATASET, LEGS, OVERLAP_BARS, compute_derived_series
+from scripts.resample import extend_resampled, resample_bars, session_open
+from scripts.storage import dataset_version, index_timestamp, read_dataset, read_manifest
+from tvdatafeed_lib import Interval, TvStream
+
+# Cache do processo: todas as sessões do Streamlit compartilham a mesma cópia de cada dataset.
+# Os DataFrames devolvidos são compartilhados e não devem ser modificados por quem os recebe.
+_cache = {}
+_lock = threading.Lock()
+
+OHLCV_DATASETS = {
+    'ZS': 'ZS_1D',
+    'ZL': 'ZL_1D',
+    'ZM': 'ZM_1D'
+}
+COT_DATASET = 'cot_soybean_products'
+
+# Contratos contínuos acompanhados ao vivo, pela raiz do dataset OHLCV
+LIVE_SYMBOLS = {
+    'ZS': 'ZS1!',
+    'ZL': 'ZL1!',
+    'ZM': 'ZM1!'
+}
+_stream = None
+
+def _prepare(df):
+    # Índice convertido, ordenado e sem datas repetidas uma única vez, na carga,
+    # para que os recortes por data possam usar busca binária
+    if not isinstance(df.index, pd.DatetimeIndex):
+        df.index = pd.to_datetime(df.index)
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind='stable')
+    if not df.index.is_unique:
+        df = df[~df.index.duplicated(keep='last')]
+    return df
+
+def date_range_view(df, start=None, end=None):
+    """Linhas com start <= índice < end, por searchsorted no índice ordenado (O(log n)).
+
+    O recorte por posição não copia os dados do DataFrame em cache. Limites sem fuso são UTC.
+    """
+    index = df.index
+    tz = getattr(index, 'tz', None)
+    first = 0 if start is None else index.searchsorted(index_timestamp(start, tz), side='left')
+    last = len(index) if end is None else index.searchsorted(index_timestamp(end, tz), side='left')
+    return df.iloc[first:last]
+
+def year_range_view(df, start_year, end_year):
+    # Anos inclusivos, como no slider da barra lateral
+    return date_range_view(df, pd.Timestamp(start_year, 1, 1), pd.Timestamp(end_year + 1, 1, 1))
+
+def load_dataset(name):
+    """Devolve o dataset do cache, relendo o parquet só quando a versão no manifesto muda"""
+    version = dataset_version(name)
+    with _lock:
+        cached = _cache.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        df = _prepare(read_dataset(name))
+        _cache[name] = (version, df)
+        return df
+
+def load_range(name, start=None, end=None, columns=None):
+    """Linhas com start <= índice < end e só as colunas pedidas, lidas do disco com o período e as
+    colunas empurrados para o parquet; em cache por período enquanto a versão do dataset não muda"""
+    version = dataset_version(name)
+    key = ('range', name, start, end, None if columns is None else tuple(columns))
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        # Períodos lidos de versões anteriores não voltam a ser usados
+        for stale in [k for k, v in _cache.items() if k[:2] == ('range', name) and v[0] != version]:
+            del _cache[stale]
+        df = _prepare(read_dataset(name, start=start, end=end, columns=columns))
+        _cache[key] = (version, df)
+        return df
+
+def load_years(name, start_year, end_year, columns=None):
+    # Anos inclusivos, como no slider da barra lateral
+    return load_range(name, pd.Timestamp(start_year, 1, 1), pd.Timestamp(end_year + 1, 1, 1), columns)
+
+def loaded_version(name):
+    cached = _cache.get(name)
+    return None if cached is None else cached[0]
+
+def load_timeframe(name, interval):
+    """Barras do dataset OHLCV name (ex.: 'ZS_1D') agregadas em interval, sem acesso à rede
+
+    O resultado fica em cache por versão do dataset base; quando ele recebe barras novas, só as
+    últimas barras agregadas são refeitas.
+    """
+    if name.rsplit('_', 1)[-1] == interval:
+        return load_dataset(name)
+    base = load_dataset(name)
+    version = loaded_version(name)
+    key = ('timeframe', name, interval)
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        # As últimas OVERLAP_BARS barras do base podem ter sido revisadas pela atualização
+        changed_from = None
+        if cached is not None and len(base) and base.index[0] == cached[2][0]:
+            changed_from = cached[2][1]
+        df = extend_resampled(base, interval, None if cached is None else cached[1], changed_from)
+        checkpoint = (base.index[0], base.index[max(len(base) - OVERLAP_BARS, 0)]) if len(base) else (None, None)
+        _cache[key] = (version, df, checkpoint)
+        return df
+
+def load_ohlcv_data():
+    return tuple(load_dataset(name) for name in OHLCV_DATASETS.values())
+
+def load_cot_data():
+    return load_dataset(COT_DATASET)
+
+def load_crush_data():
+    return load_dataset(CRUSH_DATASET)
+
+def load_cot_asof(bars_name, release_lag=COT_RELEASE_LAG, interval=None):
+    """COT alinhado às barras do dataset bars_name (agregadas em interval, se informado),
+    calculado uma vez por versão dos dois datasets"""
+    bars = load_dataset(bars_name) if interval is None else load_timeframe(bars_name, interval)
+    cot = load_cot_data()
+    key = ('cot_asof', bars_name, interval, release_lag)
+    version = (loaded_version(bars_name), loaded_version(COT_DATASET))
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        df = asof_join(bars.index, cot, release_lag)
+        _cache[key] = (version, df)
+        return df
+
+def load_contracts(root):
+    """Todos os vencimentos guardados de root, {rótulo: DataFrame}, cada um com o seu cache por versão"""
+    return {label: load_dataset(contract_dataset(root, label)) for label in stored_contracts(root, read_manifest())}
+
+def _contracts_version(root, contracts):
+    return tuple((label, loaded_version(contract_dataset(root, label))) for label in contracts)
+
+def load_continuous(root, rule='first_notice'):
+    """Série contínua de root pela regra de rolagem ROLL_RULES[rule], recalculada só quando algum contrato muda"""
+    contracts = load_contracts(root)
+    key = ('continuous', root, rule)
+    version = _contracts_version(root, contracts)
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        df = continuous_series(contracts, ROLL_RULES[rule]) if contracts else pd.DataFrame()
+        _cache[key] = (version, df)
+        return df
+
+def load_continuous_bars(root, interval='1D', rule='first_notice'):
+    """Barras OHLCV de load_continuous indexadas como as guardadas (UTC, abertura do pregão) e
+    agregadas em interval, para o gráfico e o COT da página OHLCV"""
+    continuous = load_continuous(root, rule)
+    key = ('continuous_bars', root, interval, rule)
+    version = _contracts_version(root, load_contracts(root))
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        df = continuous.drop(columns=['contract'], errors='ignore')
+        df = df.set_axis(session_open(df.index))
+        if interval != '1D':
+            df = resample_bars(df, interval)
+        _cache[key] = (version, df)
+        return df
+
+def load_continuous_cot_asof(root, interval='1D', rule='first_notice', release_lag=COT_RELEASE_LAG):
+    """Como load_cot_asof, para as barras de load_continuous_bars"""
+    bars = load_continuous_bars(root, interval, rule)
+    cot = load_cot_data()
+    key = ('continuous_cot_asof', root, interval, rule, release_lag)
+    version = (_contracts_version(root, load_contracts(root)), loaded_version(COT_DATASET))
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        df = asof_join(bars.index, cot, release_lag)
+        _cache[key] = (version, df)
+        return df
+
+def live_stream():
+    """TvStream do processo com as barras diárias de LIVE_SYMBOLS, iniciado na primeira chamada
+
+    A thread do stream só escreve nos ring buffers; as páginas leem deles a cada rerun, sem disco.
+    """
+    global _stream
+    with _lock:
+        if _stream is None:
+            _stream = TvStream(list(LIVE_SYMBOLS.values()), exchange='CBOT', interval=Interval.in_daily).start()
+        return _stream
+
+def live_version():
+    # Muda a cada barra recebida; entra nas chaves de cache das figuras com dados ao vivo
+    stream = live_stream()
+    return tuple(stream.buffers[symbol].version for symbol in stream.symbols)
+
+def live_symbol(name):
+    # 'ZS_1D' -> 'ZS1!'
+    return LIVE_SYMBOLS[name.split('_', 1)[0]]
+
+def load_live(name, interval=None):
+    """Barras do dataset diário name com as últimas barras do stream por cima (novas ou revisadas),
+    agregadas em interval se informado
+
+    Recalculado só quando a versão do dataset ou do buffer muda; a agregação refaz apenas as barras
+    de interval a partir da primeira barra ao vivo.
+    """
+    if name.rsplit('_', 1)[-1] == interval:
+        interval = None
+    stream = live_stream()
+    symbol = live_symbol(name)
+    base = load_dataset(name)
+    previous = None if interval is None else load_timeframe(name, interval)
+    key = ('live', name, interval)
+    version = (loaded_version(name), stream.buffers[symbol].version)
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        live = stream.latest(symbol)
+        if live.empty:
+            df = base if interval is None else previous
+        else:
+            df = pd.concat([base.iloc[:base.index.searchsorted(live.index[0], side='left')], live])
+            if interval is not None:
+                df = extend_resampled(df, interval, previous, changed_from=live.index[0])
+        _cache[key] = (version, df)
+        return df
+
+def load_live_cot_asof(bars_name, release_lag=COT_RELEASE_LAG, interval=None):
+    """Como load_cot_asof, para as barras de load_live"""
+    bars = load_live(bars_name, interval)
+    cot = load_cot_data()
+    key = ('live_cot_asof', bars_name, interval, release_lag)
+    version = (loaded_version(bars_name), live_stream().buffers[live_symbol(bars_name)].version,
+               loaded_version(COT_DATASET))
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        df = asof_join(bars.index, cot, release_lag)
+        _cache[key] = (version, df)
+        return df
+
+def load_live_crush():
+    """Crush spread e oil share com as barras ao vivo das pernas, recalculando só as últimas barras"""
+    legs = [load_live(name) for name in LEGS.values()]
+    existing = load_crush_data()
+    key = ('live_crush',)
+    version = (tuple(loaded_version(name) for name in LEGS.values()), loaded_version(CRUSH_DATASET),
+               live_version())
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        df = compute_derived_series(*legs, existing=existing)
+        _cache[key] = (version, df)
+        return df
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,69 @@
+import os
+import sys
+import pandas as pd
+
+# Adiciona o caminho da raiz do projeto ao sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.spreads import SPREADS, evaluate_spreads
+from scripts.storage import read_dataset, read_manifest, write_dataset
+
+CRUSH_DATASET = 'soybean_crush_1D'
+LEGS = {
+    'ZS': 'ZS_1D',
+    'ZL': 'ZL_1D',
+    'ZM': 'ZM_1D'
+}
+
+# Janela das estatísticas móveis (~1 ano de pregões) e barras recalculadas a cada atualização
+ROLLING_WINDOW = 252
+OVERLAP_BARS = 3
+
+def crush_spread_oil_share(df_ZS, df_ZL, df_ZM):
+    # Alinhar os fechamentos dos três contratos nas datas em comum
+    data_combined = pd.concat({
+        'ZL1!': df_ZL['close'],
+        'ZM1!': df_ZM['close'],
+        'ZS1!': df_ZS['close']
+    }, axis=1, join='inner').sort_index()
+
+    # Board crush em $/bu e oil share pelas definições de scripts/spreads.py
+    prices = data_combined.rename(columns=lambda column: column[:2])
+    spreads = evaluate_spreads(prices, {name: SPREADS[name] for name in ['oil_value', 'meal_value', 'board_crush', 'oil_share']})
+    data_combined[['oil_value', 'meal_value', 'crush_spread', 'oil_share']] = spreads.to_numpy()
+    return data_combined
+
+def add_rolling_stats(df, window=ROLLING_WINDOW):
+    for column in ['crush_spread', 'oil_share']:
+        rolling = df[column].rolling(window, min_periods=1)
+        df[f'{column}_mean'] = rolling.mean()
+        df[f'{column}_std'] = rolling.std()
+        df[f'{column}_zscore'] = (df[column] - df[f'{column}_mean']) / df[f'{column}_std']
+    return df
+
+def compute_derived_series(df_ZS, df_ZL, df_ZM, existing=None, window=ROLLING_WINDOW):
+    """Série derivada completa, ou só as barras novas sobre existing quando informado"""
+    if existing is None or existing.empty:
+        return add_rolling_stats(crush_spread_oil_share(df_ZS, df_ZL, df_ZM), window)
+
+    # Recalcula as últimas barras (que podem ter sido revisadas) e as novas, com o histórico
+    # necessário para as janelas móveis
+    recompute_from = existing.index[max(len(existing) - OVERLAP_BARS, 0)]
+    lookback_start = existing.index[max(len(existing) - OVERLAP_BARS - window, 0)]
+    legs = [df[df.index >= lookback_start] for df in (df_ZS, df_ZL, df_ZM)]
+    tail = add_rolling_stats(crush_spread_oil_share(*legs), window)
+    tail = tail[tail.index >= recompute_from]
+
+    return pd.concat([existing[existing.index < recompute_from], tail])
+
+def update_derived_series():
+    df_ZS, df_ZL, df_ZM = (read_dataset(name) for name in LEGS.values())
+    existing = read_dataset(CRUSH_DATASET) if CRUSH_DATASET in read_manifest() else None
+
+    df = compute_derived_series(df_ZS, df_ZL, df_ZM, existing)
+    write_dataset(CRUSH_DATASET, df)
+    print(f"Crush spread and oil share saved to '{CRUSH_DATASET}' ({len(df)} rows)")
+    return df
+
+if __name__ == '__main__':
+    update_derived_series()
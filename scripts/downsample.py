@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+# Pontos por série enviados ao navegador: os gráficos têm ~1200px de largura,
+# então mais pontos que isso não aparecem na tela
+LINE_POINT_BUDGET = 2000
+CANDLE_POINT_BUDGET = 5000
+# Marcadores de sinais desenhados de uma vez sobre os candles
+MARKER_BUDGET = 1000
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return values.astype(np.float64)
+
+def lttb_indices(x, y, n_out):
+    """Índices escolhidos pelo Largest-Triangle-Three-Buckets, incluindo o primeiro e o último ponto"""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = _as_float(y)
+
+    # n_out - 2 baldes entre o primeiro e o último ponto
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    edges = np.append(edges, n)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # Média de cada balde, calculada de uma vez para todos
+    sizes = np.diff(edges)
+    avg_x = np.add.reduceat(x, edges[:-1]) / sizes
+    avg_y = np.add.reduceat(np.nan_to_num(y), edges[:-1]) / sizes
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # O terceiro vértice é a média do balde seguinte
+        next_x, next_y = avg_x[i + 1], avg_y[i + 1]
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        selected[i + 1] = a
+
+    return selected
+
+def downsample_line(series, max_points=LINE_POINT_BUDGET):
+    if max_points is None or len(series) <= max_points:
+        return series
+    return series.iloc[lttb_indices(series.index.values, series.values, max_points)]
+
+def aggregate_bars(df, starts):
+    """Agrega as barras de cada grupo que começa em starts (posições crescentes) preservando abertura,
+    máxima, mínima, fechamento e soma do volume; cada grupo recebe o horário da sua primeira barra"""
+    n = len(df)
+    ends = np.append(starts[1:], n) - 1
+    data = {
+        'open': df['open'].values[starts],
+        'high': np.maximum.reduceat(df['high'].values, starts),
+        'low': np.minimum.reduceat(df['low'].values, starts),
+        'close': df['close'].values[ends],
+    }
+    if 'volume' in df:
+        data['volume'] = np.add.reduceat(df['volume'].values, starts)
+    return pd.DataFrame(data, index=df.index[starts])
+
+def downsample_ohlc(df, max_points=CANDLE_POINT_BUDGET):
+    """Agrega barras consecutivas em baldes do mesmo tamanho, no máximo max_points"""
+    n = len(df)
+    if max_points is None or n <= max_points:
+        return df
+    return aggregate_bars(df, np.linspace(0, n, max_points, endpoint=False).astype(np.int64))
+
+def select_markers(signals, bar_index, max_markers=MARKER_BUDGET):
+    """Sinais 'up'/'down' encaixados nas barras de bar_index, um por barra e direção, com no máximo max_markers
+
+    Cada sinal vai para a barra que começa no seu horário ou antes (a barra agregada que o contém
+    quando o histórico foi reduzido). Devolve as posições em bar_index e um booleano 'up' por marcador.
+    """
+    values = signals.to_numpy()
+    up = values == 'up'
+    positions = np.flatnonzero(up | (values == 'down'))
+    up = up[positions]
+
+    bars = bar_index.searchsorted(signals.index[positions], side='right') - 1
+    valid = bars >= 0
+    bars, up = bars[valid], up[valid]
+
+    # Último sinal de cada direção em cada barra; a chave mantém a ordem cronológica
+    keys = bars * 2 + up
+    _, first_in_reversed = np.unique(keys[::-1], return_index=True)
+    last = len(keys) - 1 - first_in_reversed
+    bars, up = bars[last], up[last]
+
+    # Sinais densos demais são espaçados uniformemente ao longo do período
+    if max_markers is not None and len(bars) > max_markers:
+        keep = np.unique(np.linspace(0, len(bars) - 1, max_markers).astype(np.int64))
+        bars, up = bars[keep], up[keep]
+    return bars, up
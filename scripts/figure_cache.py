@@ -0,0 +1,43 @@
+import json
+import threading
+from collections import OrderedDict
+
+# Figuras serializadas em JSON, compartilhadas entre sessões e descartadas por LRU
+# quando o total passa do limite de memória
+MAX_BYTES = 64 * 1024 * 1024
+
+_figures = OrderedDict()
+_size = 0
+_lock = threading.Lock()
+
+def cached_figure(key, build, max_bytes=MAX_BYTES):
+    """Devolve a figura (dict do Plotly) da chave, construindo com build() só na primeira vez
+
+    A chave deve conter tudo que muda a figura: versões dos datasets, período e tema.
+    """
+    global _size
+    with _lock:
+        if key in _figures:
+            _figures.move_to_end(key)
+            return json.loads(_figures[key])
+
+    figure_json = build().to_json()
+
+    with _lock:
+        if key not in _figures:
+            _figures[key] = figure_json
+            _size += len(figure_json)
+        while _size > max_bytes and len(_figures) > 1:
+            _, evicted = _figures.popitem(last=False)
+            _size -= len(evicted)
+
+    return json.loads(figure_json)
+
+def cache_size():
+    return len(_figures), _size
+
+def clear_figures():
+    global _size
+    with _lock:
+        _figures.clear()
+        _size = 0
@@ -0,0 +1,49 @@
+"""Converte para UTC os datasets de barras gravados com horário local sem fuso
+
+Até a troca para tvdatafeed_lib.main.utc_index, as barras eram gravadas no horário local da máquina
+que fez a atualização. Cada dataset de barras sem fuso é lido, localizado em --from-tz e gravado
+de novo em UTC; datasets que já estão em UTC ficam como estão, então rodar de novo não muda nada.
+
+    python scripts/migrate_utc.py --from-tz UTC-03:00          # offset fixo
+    python scripts/migrate_utc.py --from-tz America/Sao_Paulo  # fuso com horário de verão
+"""
+import argparse
+import os
+import sys
+
+# Adiciona o caminho da raiz do projeto ao sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.resample import TIMEFRAMES
+from scripts.storage import DATA_DIR, read_dataset, read_manifest, write_dataset
+
+def is_bar_dataset(name):
+    # Barras terminam no intervalo (ZS_1D, ZS_2024N_1D, soybean_crush_1D); o COT só tem datas, sem horário
+    return name.rsplit('_', 1)[-1] in TIMEFRAMES
+
+def migrate_dataset(name, source_tz, data_dir=DATA_DIR):
+    """Regrava o dataset name em UTC; devolve False se ele já tinha fuso"""
+    df = read_dataset(name, data_dir)
+    if df.index.tz is not None:
+        return False
+    df.index = df.index.tz_localize(source_tz, ambiguous='infer').tz_convert('UTC').as_unit('ns')
+    # Mesma disposição e codificação de antes
+    entry = read_manifest(data_dir)[name]
+    write_dataset(name, df, data_dir, partitioned=entry.get('layout') == 'partitioned',
+                  compact=entry.get('encoding') == 'compact')
+    return True
+
+def migrate(source_tz, data_dir=DATA_DIR):
+    migrated = []
+    for name in sorted(read_manifest(data_dir)):
+        if is_bar_dataset(name) and migrate_dataset(name, source_tz, data_dir):
+            migrated.append(name)
+    return migrated
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--from-tz', required=True,
+                        help="fuso da máquina que gravou os dados, ex.: 'UTC-03:00' ou 'America/Sao_Paulo'")
+    args = parser.parse_args()
+    for name in migrate(args.from_tz):
+        print(f"'{name}' converted to UTC")
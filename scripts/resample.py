@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from scripts.downsample import aggregate_bars
+from tvdatafeed_lib import Interval
+
+# Sessão dos grãos na CBOT: o pregão abre às 19:00 (Chicago) da véspera da data de negociação.
+# Horários a partir de SESSION_ROLL já pertencem ao pregão seguinte; as barras diárias do
+# TradingView (19:00 em Chicago na abertura do pregão, 00:00 ou 01:00 UTC) caem assim na data certa.
+EXCHANGE_TZ = 'America/Chicago'
+SESSION_OPEN = pd.Timedelta(hours=19)
+SESSION_ROLL = pd.Timedelta(hours=17)
+
+# Intervalos intradiários em minutos; os demais seguem o calendário de pregões
+INTRADAY_MINUTES = {
+    '1': 1, '3': 3, '5': 5, '15': 15, '30': 30, '45': 45,
+    '1H': 60, '2H': 120, '3H': 180, '4H': 240
+}
+TIMEFRAMES = [interval.value for interval in Interval]
+
+def exchange_time(index):
+    """Horário da bolsa, sem fuso, de cada barra do índice em UTC (tvdatafeed_lib.main.utc_index)
+
+    Índices sem fuso são tomados como UTC, então o resultado não depende do fuso da máquina.
+    """
+    index = pd.DatetimeIndex(index)
+    utc = index.tz_localize('UTC') if index.tz is None else index
+    return utc.tz_convert(EXCHANGE_TZ).tz_localize(None).as_unit('ns')
+
+def can_derive(base_interval, interval):
+    """Se barras de interval podem ser montadas a partir de barras de base_interval"""
+    base_minutes = INTRADAY_MINUTES.get(base_interval)
+    if interval in INTRADAY_MINUTES:
+        return base_minutes is not None and INTRADAY_MINUTES[interval] % base_minutes == 0
+    if interval == '1D':
+        return base_minutes is not None or base_interval == '1D'
+    # Semanas atravessam meses, então o mensal só sai de barras diárias ou menores
+    return base_minutes is not None or base_interval in ('1D', interval)
+
+def derivable_timeframes(base_interval):
+    return [interval for interval in TIMEFRAMES if can_derive(base_interval, interval)]
+
+def trading_dates(index, local=None):
+    """Data de negociação (pregão) de cada barra do índice"""
+    local = exchange_time(index) if local is None else local
+    return (local + (pd.Timedelta(days=1) - SESSION_ROLL)).floor('D')
+
+def session_open(dates):
+    """Horário UTC da abertura do pregão de cada data de negociação, o mesmo das barras diárias guardadas"""
+    local = pd.DatetimeIndex(dates) - pd.Timedelta(days=1) + SESSION_OPEN
+    return local.tz_localize(EXCHANGE_TZ).tz_convert('UTC').as_unit('ns').rename('datetime')
+
+def _group_keys(index, interval):
+    # Chave inteira do grupo de cada barra; barras consecutivas com a mesma chave formam uma barra de interval
+    local = exchange_time(index)
+    trading_date = trading_dates(index, local)
+    if interval == '1D':
+        return trading_date.asi8
+    if interval == '1W':
+        return (trading_date - pd.to_timedelta(trading_date.dayofweek, unit='D')).asi8
+    if interval == '1M':
+        return np.asarray(trading_date.year * 12 + trading_date.month, dtype=np.int64)
+
+    # Intradiário: blocos de largura fixa contados a partir da abertura do pregão
+    width = pd.Timedelta(minutes=INTRADAY_MINUTES[interval]).value
+    session_open = (trading_date - pd.Timedelta(days=1) + SESSION_OPEN).asi8
+    return session_open + (local.asi8 - session_open) // width * width
+
+def resample_bars(df, interval):
+    """Barras OHLCV de df agregadas em interval, com o horário da primeira barra de cada grupo"""
+    if df.empty:
+        return df
+    keys = _group_keys(df.index, interval)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return aggregate_bars(df, starts)
+
+def extend_resampled(base, interval, previous=None, changed_from=None):
+    """previous estendido com as barras novas de base
+
+    changed_from é o primeiro horário de base que pode ter mudado desde que previous foi montado;
+    só a barra de interval que o contém e as seguintes são refeitas. Sem ele tudo é recalculado.
+    """
+    if previous is None or previous.empty or changed_from is None:
+        return resample_bars(base, interval)
+
+    position = max(previous.index.searchsorted(changed_from, side='right') - 1, 0)
+    start = base.index.searchsorted(previous.index[position], side='left')
+    tail = resample_bars(base.iloc[start:], interval)
+    return pd.concat([previous.iloc[:position], tail])
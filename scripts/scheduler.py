@@ -0,0 +1,191 @@
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Adiciona o caminho da raiz do projeto ao sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.resample import EXCHANGE_TZ
+from scripts.storage import DATA_DIR, _atomic_write_bytes
+from scripts.update_data import update_contract_data, update_cot_reports, update_ohlcv_data
+
+UPDATE_JOBS = {
+    'ohlcv': update_ohlcv_data,
+    'cot': update_cot_reports,
+    'contracts': update_contract_data,
+}
+
+# Horários (Chicago) das atualizações automáticas: depois do fechamento do pregão diurno da CBOT
+# (13:20) nos dias úteis, com os vencimentos das séries contínuas ajustadas, e depois da publicação
+# do COT na sexta (15:30 em Nova York)
+SCHEDULE = [
+    {'jobs': ['ohlcv', 'contracts'], 'weekdays': [0, 1, 2, 3, 4], 'time': '13:45'},
+    {'jobs': ['cot'], 'weekdays': [4], 'time': '14:45'},
+]
+
+LOCK_PATH = os.path.join(DATA_DIR, '.update.lock')
+STATUS_PATH = os.path.join(DATA_DIR, 'update_status.json')
+
+def next_scheduled_run(now=None, schedule=SCHEDULE):
+    """(horário UTC, jobs) da próxima atualização agendada depois de now"""
+    now = pd.Timestamp.now(tz='UTC') if now is None else pd.Timestamp(now)
+    local_now = now.tz_convert(EXCHANGE_TZ)
+    candidates = []
+    for entry in schedule:
+        hour, minute = map(int, entry['time'].split(':'))
+        for days in range(8):
+            day = (local_now + pd.Timedelta(days=days)).normalize()
+            due = day.replace(hour=hour, minute=minute)
+            if day.dayofweek in entry['weekdays'] and due > local_now:
+                candidates.append((due.tz_convert('UTC'), entry['jobs']))
+                break
+    when = min(due for due, _ in candidates)
+    jobs = sorted({job for due, entry_jobs in candidates if due == when for job in entry_jobs})
+    return when, jobs
+
+def read_status(status_path=STATUS_PATH):
+    try:
+        with open(status_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'state': 'idle'}
+
+class UpdateScheduler:
+    """Executa as atualizações de dados numa thread de fundo, fora do rerun do Streamlit
+
+    Pedidos repetidos enquanto os mesmos jobs estão na fila ou rodando são ignorados, e um arquivo de
+    lock impede que dois processos (por exemplo dois servidores ou o agendador de linha de comando)
+    baixem os dados ao mesmo tempo. O estado é gravado em STATUS_PATH para a interface consultar.
+    """
+
+    def __init__(self, jobs=UPDATE_JOBS, schedule=SCHEDULE, lock_path=LOCK_PATH, status_path=STATUS_PATH):
+        self.jobs = jobs
+        self.schedule = schedule
+        self.lock_path = lock_path
+        self.status_path = status_path
+        self._pending = set()
+        self._running = set()
+        self._condition = threading.Condition()
+        self._status_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+
+    def start(self):
+        with self._condition:
+            if self._thread is not None and self._thread.is_alive():
+                return self
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='update-scheduler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def trigger(self, jobs=None, reason='manual'):
+        """Enfileira os jobs (todos por padrão); devolve False se todos já estavam na fila ou rodando"""
+        jobs = set(self.jobs if jobs is None else jobs)
+        with self._condition:
+            new = jobs - self._pending - self._running
+            if not new:
+                return False
+            self._pending |= new
+            self._write_status(state='queued' if not self._running else 'running', queued=sorted(self._pending),
+                               reason=reason)
+            self._condition.notify_all()
+        return True
+
+    def status(self):
+        # Lido do arquivo, para refletir também atualizações feitas por outro processo
+        return read_status(self.status_path)
+
+    def _write_status(self, **fields):
+        with self._status_lock:
+            status = read_status(self.status_path)
+            status.update(fields, next_run=str(next_scheduled_run(schedule=self.schedule)[0]))
+            content = json.dumps(status, indent=2, sort_keys=True).encode()
+            _atomic_write_bytes(self.status_path, content)
+
+    def _run(self):
+        next_run, scheduled_jobs = next_scheduled_run(schedule=self.schedule)
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    remaining = (next_run - pd.Timestamp.now(tz='UTC')).total_seconds()
+                    if remaining <= 0:
+                        self._pending |= set(scheduled_jobs)
+                        self._write_status(reason='schedule')
+                        next_run, scheduled_jobs = next_scheduled_run(schedule=self.schedule)
+                        break
+                    self._condition.wait(remaining)
+                if self._stopping:
+                    return
+                jobs, self._pending = self._pending, set()
+                self._running = jobs
+            try:
+                self._execute(jobs)
+            finally:
+                with self._condition:
+                    self._running = set()
+
+    def _execute(self, jobs):
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, 'w') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Outro processo já está atualizando; os dados dele aparecem pelo manifesto
+                    self._write_status(state='skipped', finished_at=time.time(), error='update running in another process')
+                    return
+
+            started = time.time()
+            self._write_status(state='running', jobs=sorted(jobs), queued=sorted(self._pending), started_at=started,
+                               finished_at=None, error=None)
+            errors = []
+            # OHLCV, COT e vencimentos, na ordem de UPDATE_JOBS
+            for name in [name for name in self.jobs if name in jobs]:
+                try:
+                    self.jobs[name]()
+                except Exception:
+                    errors.append(f'{name}: {traceback.format_exc(limit=3)}')
+            self._write_status(state='failed' if errors else 'succeeded', finished_at=time.time(),
+                               duration=time.time() - started, error='\n'.join(errors) or None,
+                               queued=sorted(self._pending))
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Agendador do processo, iniciado na primeira chamada e compartilhado por todas as sessões"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = UpdateScheduler()
+        return _scheduler.start()
+
+if __name__ == '__main__':
+    # Modo processo separado: python scripts/scheduler.py [--now]
+    scheduler = get_scheduler()
+    if '--now' in sys.argv:
+        scheduler.trigger(reason='command line')
+    print(f"Next scheduled update: {next_scheduled_run()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
@@ -0,0 +1,103 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+# Definições declarativas: pesos por perna ({'perna': peso}) para spreads lineares, ou
+# {'numerator': {...}, 'denominator': {...}} para razões. Unidades: ZS/ZC em c/bu,
+# ZL em c/lb e ZM em $/short ton, então os pesos do crush dão $/bu.
+SPREADS = {
+    'oil_value': {'ZL': 0.11},
+    'meal_value': {'ZM': 0.022},
+    'board_crush': {'ZL': 0.11, 'ZM': 0.022, 'ZS': -0.01},
+    'reverse_crush': {'ZS': 0.01, 'ZL': -0.11, 'ZM': -0.022},
+    'oil_share': {
+        'numerator': {'ZL': 0.11},
+        'denominator': {'ZL': 0.11, 'ZM': 0.022}
+    },
+    'zs_zc_ratio': {
+        'numerator': {'ZS': 1.0},
+        'denominator': {'ZC': 1.0}
+    },
+}
+
+def _weight_matrix(legs, weights_by_spread):
+    # Matriz pernas x spreads com os pesos de cada definição
+    matrix = np.zeros((len(legs), len(weights_by_spread)))
+    position = {leg: i for i, leg in enumerate(legs)}
+    for j, weights in enumerate(weights_by_spread):
+        for leg, weight in weights.items():
+            matrix[position[leg], j] = weight
+    return matrix
+
+def evaluate_spreads(prices, definitions=None):
+    """Calcula todas as definições de uma vez: (barras x pernas) @ (pernas x spreads)
+
+    prices tem uma coluna por perna, já alinhadas no mesmo índice. Definições com pernas
+    ausentes em prices são ignoradas.
+    """
+    definitions = SPREADS if definitions is None else definitions
+    legs = list(prices.columns)
+
+    usable = {}
+    for name, definition in definitions.items():
+        numerator = definition.get('numerator', definition)
+        denominator = definition.get('denominator')
+        if set(numerator) <= set(legs) and (denominator is None or set(denominator) <= set(legs)):
+            usable[name] = (numerator, denominator)
+
+    entries = list(usable.values())
+    values = prices.to_numpy(dtype=np.float64)
+    numerators = _weight_matrix(legs, [numerator for numerator, _ in entries])
+    result = values @ numerators
+
+    # Spreads lineares dividem por 1; razões pelo próprio produto matricial do denominador
+    ratios = [j for j, (_, denominator) in enumerate(entries) if denominator is not None]
+    if ratios:
+        denominators = _weight_matrix(legs, [entries[j][1] for j in ratios])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result[:, ratios] = result[:, ratios] / (values @ denominators)
+
+    return pd.DataFrame(result, index=prices.index, columns=list(usable))
+
+def pairwise_spreads(prices, ratio=False):
+    """Spread (ou razão) entre cada par de colunas, por exemplo todos os calendar spreads
+    entre os meses de um contrato, numa única operação matricial"""
+    columns = list(prices.columns)
+    pairs = list(itertools.combinations(range(len(columns)), 2))
+    values = prices.to_numpy(dtype=np.float64)
+    first = [i for i, _ in pairs]
+    second = [j for _, j in pairs]
+
+    if ratio:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = values[:, first] / values[:, second]
+        separator = '/'
+    else:
+        result = values[:, first] - values[:, second]
+        separator = '-'
+
+    names = [f'{columns[i]}{separator}{columns[j]}' for i, j in pairs]
+    return pd.DataFrame(result, index=prices.index, columns=names)
+
+def expand_by_month(definitions, months):
+    """Repete cada definição para todas as combinações de meses das pernas
+
+    As colunas de preço devem se chamar '<perna>_<mês>' (ex.: 'ZS_2024N'); months
+    mapeia cada perna para a lista dos seus meses.
+    """
+    expanded = {}
+    for name, definition in definitions.items():
+        parts = {key: definition[key] for key in ('numerator', 'denominator') if key in definition} or {None: definition}
+        legs = sorted({leg for weights in parts.values() for leg in weights})
+        if not all(leg in months for leg in legs):
+            continue
+        for combination in itertools.product(*(months[leg] for leg in legs)):
+            month_of = dict(zip(legs, combination))
+            renamed = {
+                key: {f'{leg}_{month_of[leg]}': weight for leg, weight in weights.items()}
+                for key, weights in parts.items()
+            }
+            suffix = '_'.join(f'{leg}{month_of[leg]}' for leg in legs)
+            expanded[f'{name}[{suffix}]'] = renamed[None] if None in renamed else renamed
+    return expanded
@@ -0,0 +1,321 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+MANIFEST_NAME = 'manifest.json'
+INDEX_COLUMN = 'datetime'
+
+# Datasets particionados por ano em data/<símbolo>_<intervalo>/year=AAAA/, com row groups pequenos o
+# bastante para que as estatísticas de min/max do parquet descartem trechos fora do período pedido
+ROW_GROUP_ROWS = 50_000
+
+# Arquivos substituídos continuam no disco por este tempo (segundos), para quem leu o manifesto
+# anterior ainda conseguir abri-los; são apagados numa gravação seguinte do mesmo dataset
+SUPERSEDED_GRACE = 600
+
+def dataset_path(name, data_dir=DATA_DIR):
+    return os.path.join(data_dir, f'{name}.parquet')
+
+def dataset_location(name, data_dir=DATA_DIR):
+    # Arquivo único ou diretório dos anos, conforme a disposição registrada no manifesto
+    if read_manifest(data_dir).get(name, {}).get('layout') == 'partitioned':
+        return os.path.join(data_dir, name)
+    return dataset_path(name, data_dir)
+
+def partition_file(name, year, version=0):
+    # Cada gravação de um ano vai para um arquivo novo (part-<versão>); nunca se sobrescreve o arquivo
+    # que um leitor do manifesto anterior pode estar abrindo. Versão 0: disposição antiga, sem versão
+    return f'{name}/year={year}/part-{version}.parquet'
+
+def partition_path(name, year, data_dir=DATA_DIR, partition=None):
+    """Caminho do ano year do dataset, pelo arquivo registrado na entrada partition do manifesto"""
+    relative = partition['file'] if partition and 'file' in partition else partition_file(name, year)
+    return os.path.join(data_dir, *relative.split('/'))
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _atomic_write_bytes(path, content):
+    # Grava num temporário do mesmo diretório e troca com rename: quem lê vê o arquivo antigo ou o novo, nunca metade
+    directory = os.path.dirname(path)
+    tmp_path = os.path.join(directory, f'.{os.path.basename(path)}.{uuid.uuid4().hex}.tmp')
+    # Criado com 0o666 e a umask aplicada pelo kernel, como num open() comum: outro usuário
+    # (agendador, cron) precisa ler os dados, e o rename mantém as permissões
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_dir(directory)
+
+@contextmanager
+def _manifest_lock(data_dir):
+    # Serializa escritores concorrentes do manifesto (por exemplo duas atualizações simultâneas)
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(data_dir, '.manifest.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def read_manifest(data_dir=DATA_DIR):
+    try:
+        with open(os.path.join(data_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _write_manifest(manifest, data_dir):
+    content = json.dumps(manifest, indent=2, sort_keys=True).encode()
+    _atomic_write_bytes(os.path.join(data_dir, MANIFEST_NAME), content)
+
+def _timezone(index):
+    tz = getattr(index, 'tz', None)
+    return None if tz is None else str(tz)
+
+def _describe(df, content, version):
+    index = df.index
+    return {
+        'version': version,
+        'rows': int(len(df)),
+        'min_timestamp': str(index.min()) if len(index) else None,
+        'max_timestamp': str(index.max()) if len(index) else None,
+        # Barras do TradingView ficam em UTC ('UTC'); datas sem horário, como as do COT, sem fuso (None)
+        'timezone': _timezone(index),
+        'sha256': hashlib.sha256(content).hexdigest(),
+        'updated_at': time.time(),
+    }
+
+def index_timestamp(value, tz=None):
+    """value como Timestamp comparável a um índice no fuso tz (None: índice sem fuso)
+
+    Horários sem fuso são tomados como UTC, o fuso em que as barras são gravadas.
+    """
+    value = pd.Timestamp(value)
+    if tz is None:
+        return value if value.tz is None else value.tz_convert('UTC').tz_localize(None)
+    return value.tz_localize('UTC').tz_convert(tz) if value.tz is None else value.tz_convert(tz)
+
+def _encode(df):
+    # Codificação compacta: preços em float32 e o índice em segundos desde a época (int64)
+    df = df.astype({column: np.float32 for column in df.columns if df[column].dtype == np.float64})
+    df.index = pd.Index(df.index.values.astype('datetime64[s]').astype(np.int64), name=df.index.name)
+    return df
+
+def _decode(df, tz=None):
+    df = df.astype({column: np.float64 for column in df.columns if df[column].dtype == np.float32})
+    index = pd.DatetimeIndex(df.index.values.astype('datetime64[s]').astype('datetime64[ns]'), name=df.index.name)
+    df.index = index if tz is None else index.tz_localize('UTC').tz_convert(tz)
+    return df
+
+def _to_parquet(df, compact):
+    return (_encode(df) if compact else df).to_parquet(index=True, row_group_size=ROW_GROUP_ROWS)
+
+def _entry_files(name, entry, data_dir):
+    # Arquivos que a entrada do manifesto usa
+    if not entry:
+        return set()
+    if entry.get('layout') != 'partitioned':
+        return {dataset_path(name, data_dir)}
+    return {partition_path(name, year, data_dir, partition) for year, partition in entry['partitions'].items()}
+
+def _collect_superseded(name, previous, entry, data_dir, now):
+    """Lista de arquivos substituídos ainda guardados; apaga os que passaram de SUPERSEDED_GRACE
+
+    Nada é apagado na mesma gravação que deixa de usar o arquivo: leitores com o manifesto anterior
+    continuam encontrando todos os anos da versão que leram.
+    """
+    in_use = _entry_files(name, entry, data_dir)
+    superseded = previous.get('superseded', []) + [
+        {'file': os.path.relpath(path, data_dir), 'since': now}
+        for path in sorted(_entry_files(name, previous, data_dir) - in_use)
+    ]
+
+    kept = []
+    for item in superseded:
+        path = os.path.join(data_dir, item['file'])
+        # Um arquivo que voltou a ser usado (ex.: o arquivo único regravado) não é apagado
+        if path in in_use:
+            continue
+        if now - item['since'] < SUPERSEDED_GRACE:
+            kept.append(item)
+        elif os.path.exists(path):
+            os.remove(path)
+            _fsync_dir(os.path.dirname(path))
+            # Ano que deixou de existir: o diretório year=AAAA fica vazio
+            if os.path.dirname(path) != data_dir and not os.listdir(os.path.dirname(path)):
+                os.rmdir(os.path.dirname(path))
+    return kept
+
+def write_dataset(name, df, data_dir=DATA_DIR, partitioned=True, compact=False):
+    """Grava o dataset de forma atômica e registra versão, linhas, período e checksum no manifesto
+
+    Particionado, cada ano vai para o seu arquivo e só os anos cujo conteúdo mudou são regravados, em
+    arquivos novos que o manifesto passa a apontar; os substituídos são apagados em gravações posteriores.
+    compact grava preços em float32 e o índice como inteiro (segundos); a leitura desfaz a conversão.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    # Os filtros de período procuram o índice por este nome
+    df = df.rename_axis(INDEX_COLUMN)
+
+    with _manifest_lock(data_dir):
+        manifest = read_manifest(data_dir)
+        previous = manifest.get(name, {})
+        version = previous.get('version', 0) + 1
+
+        if not partitioned:
+            content = _to_parquet(df, compact)
+            _atomic_write_bytes(dataset_path(name, data_dir), content)
+            entry = _describe(df, content, version)
+        else:
+            old_partitions = previous.get('partitions', {})
+            partitions = {}
+            years = df.index.year
+            for year in np.unique(years):
+                part = df[years == year]
+                content = _to_parquet(part, compact)
+                description = _describe(part, content, version)
+                key = str(year)
+                old = old_partitions.get(key)
+                if (old is not None and old['sha256'] == description['sha256']
+                        and os.path.exists(partition_path(name, key, data_dir, old))):
+                    partitions[key] = old
+                    continue
+                partition = {field: description[field] for field in ('version', 'rows', 'min_timestamp', 'max_timestamp', 'sha256')}
+                partition['file'] = partition_file(name, key, version)
+                path = partition_path(name, key, data_dir, partition)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                _atomic_write_bytes(path, content)
+                partitions[key] = partition
+
+            checksum = ''.join(partitions[key]['sha256'] for key in sorted(partitions)).encode()
+            entry = _describe(df, checksum, version)
+            entry['layout'] = 'partitioned'
+            entry['partitions'] = partitions
+
+        entry['encoding'] = 'compact' if compact else 'plain'
+        # Os arquivos novos só passam a valer com a troca do manifesto; os antigos saem depois
+        entry['superseded'] = _collect_superseded(name, previous, entry, data_dir, time.time())
+        manifest[name] = entry
+        _write_manifest(manifest, data_dir)
+
+    return manifest[name]
+
+def dataset_version(name, data_dir=DATA_DIR):
+    entry = read_manifest(data_dir).get(name)
+    if entry is not None:
+        return entry['version']
+    # Sem manifesto, a data de modificação do arquivo identifica a versão
+    try:
+        return os.stat(dataset_path(name, data_dir)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def read_dataset(name, data_dir=DATA_DIR, start=None, end=None, columns=None):
+    """Lê o dataset, opcionalmente só as linhas com start <= índice < end e só as colunas em columns
+
+    O período é empurrado para a leitura: em datasets particionados só os anos necessários são abertos,
+    e os filtros sobre o índice usam as estatísticas dos row groups para pular o que está fora dele.
+    """
+    entry = read_manifest(data_dir).get(name, {})
+    compact = entry.get('encoding') == 'compact'
+    first_path = dataset_path(name, data_dir)
+    if entry.get('layout') == 'partitioned':
+        partitions = entry['partitions']
+        years = sorted(int(year) for year in partitions)
+        first_path = partition_path(name, years[0], data_dir, partitions[str(years[0])])
+    # Limites no fuso do índice gravado, para que o filtro compare valores do mesmo tipo
+    tz = entry['timezone'] if 'timezone' in entry else _schema_timezone(first_path)
+    start = None if start is None else index_timestamp(start, tz)
+    end = None if end is None else index_timestamp(end, tz)
+
+    if entry.get('layout') == 'partitioned':
+        selected = [year for year in years
+                    if (start is None or year >= start.year)
+                    and (end is None or pd.Timestamp(year, 1, 1, tz=tz) < end)]
+        # Sem anos no período, um arquivo qualquer com o filtro devolve o esquema sem linhas
+        paths = [partition_path(name, year, data_dir, partitions[str(year)]) for year in selected or years[:1]]
+    else:
+        paths = [first_path]
+
+    if start is None and end is None and columns is None and len(paths) == 1 and not compact:
+        return pd.read_parquet(paths[0])
+
+    def bound(value):
+        return int(value.value // 10 ** 9) if compact else value
+
+    filters = []
+    if start is not None:
+        filters.append((INDEX_COLUMN, '>=', bound(start)))
+    if end is not None:
+        filters.append((INDEX_COLUMN, '<', bound(end)))
+    table = pq.read_table(paths if len(paths) > 1 else paths[0],
+                          columns=None if columns is None else [*columns, INDEX_COLUMN],
+                          filters=filters or None, partitioning=None)
+    df = table.to_pandas()
+    return _decode(df, tz) if compact else df
+
+def _schema_timezone(path):
+    # Datasets sem fuso no manifesto (gravados antes dele registrar o fuso): o tipo da coluna no parquet
+    try:
+        field = pq.read_schema(path).field(INDEX_COLUMN)
+    except (FileNotFoundError, KeyError):
+        return None
+    tz = getattr(field.type, 'tz', None)
+    return tz or None
+
+def read_dataset_if_changed(name, known_version, data_dir=DATA_DIR):
+    """Devolve (df, versão), ou (None, versão) se a versão não mudou desde known_version"""
+    version = dataset_version(name, data_dir)
+    if known_version is not None and version == known_version:
+        return None, version
+    return read_dataset(name, data_dir), version
+
+def rebuild_manifest(data_dir=DATA_DIR):
+    # Registra no manifesto os arquivos existentes que ainda não constam nele
+    with _manifest_lock(data_dir):
+        manifest = read_manifest(data_dir)
+        for file_name in sorted(os.listdir(data_dir)):
+            name, ext = os.path.splitext(file_name)
+            if ext != '.parquet' or name in manifest:
+                continue
+            path = os.path.join(data_dir, file_name)
+            with open(path, 'rb') as f:
+                content = f.read()
+            manifest[name] = _describe(pd.read_parquet(path), content, 1)
+        _write_manifest(manifest, data_dir)
+    return manifest
+
+if __name__ == '__main__':
+    print(json.dumps(rebuild_manifest(), indent=2))
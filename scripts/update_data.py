@@ -1,5 +1,8 @@
-import cot_reports as cot
+import argparse
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import sys
 import os
@@ -8,29 +11,46 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from tvdatafeed_lib.main import TvDatafeed, Interval
+from scripts.contracts import CONTRACT_MONTHS, contract_dataset, contract_symbol, last_trade_date, listed_contracts
+from scripts.cot_cache import read_cot_year
+from scripts.derived import update_derived_series
+from scripts.resample import trading_dates
+from scripts.storage import dataset_location, dataset_path, read_dataset, read_manifest, write_dataset
+
+COT_COLUMNS = [
+    "Market and Exchange Names",
+    "As of Date in Form YYYY-MM-DD",
+    "Noncommercial Positions-Long (All)",
+    "Noncommercial Positions-Short (All)",
+    "Change in Noncommercial-Long (All)",
+    "Change in Noncommercial-Short (All)",
+    "% of OI-Noncommercial-Long (All)",
+    "% of OI-Noncommercial-Short (All)"
+]
+
+# Códigos de mercado da CFTC (CBOT), que já excluem os contratos mini
+MARKET_CODES = {
+    'ZL': '007601',
+    'ZM': '026603',
+    'ZS': '005602'
+}
 
 def fetch_cot_data(year):
-    df = cot.cot_year(year=year, cot_report_type='legacy_fut')
+    # Anos anteriores vêm do cache local; só o ano corrente é baixado de novo.
+    # Só as colunas e os mercados de soja são decodificados.
+    df = read_cot_year(year, cot_report_type='legacy_fut', columns=COT_COLUMNS,
+                       market_codes=MARKET_CODES.values())
     return df
 
-def process_cot_data(df, commodity):
-    filtered_df = df[[
-        "Market and Exchange Names", 
-        "As of Date in Form YYYY-MM-DD", 
-        "Noncommercial Positions-Long (All)", 
-        "Noncommercial Positions-Short (All)", 
-        "Change in Noncommercial-Long (All)", 
-        "Change in Noncommercial-Short (All)",
-        "% of OI-Noncommercial-Long (All)",
-        "% of OI-Noncommercial-Short (All)"
-    ]]
-    
-    commodity_df = filtered_df[
-        filtered_df["Market and Exchange Names"].str.contains(commodity, case=False, na=False) & 
-        ~filtered_df["Market and Exchange Names"].str.contains('MINI', case=False, na=False)
-    ]
-    
-    return commodity_df
+def process_cot_data(df):
+    # Separa os três produtos em uma única passagem pelo código de mercado
+    codes = df['CFTC Contract Market Code'].str.strip()
+    cot_types = {code: cot_type for cot_type, code in MARKET_CODES.items()}
+    return {
+        cot_types[code]: commodity_df[COT_COLUMNS]
+        for code, commodity_df in df.groupby(codes, sort=False)
+        if code in cot_types
+    }
 
 def calculate_cot(df, cot_type):
     df[f'{cot_type}_COT_%'] = (df["% of OI-Noncommercial-Long (All)"] - df["% of OI-Noncommercial-Short (All)"])
@@ -41,28 +61,44 @@ def calculate_cot(df, cot_type):
     
     return df[[f'{cot_type}_COT_%']]
 
-def extract_COT(start_year=2024):
+COMMODITIES = {
+    'ZL': 'SOYBEAN OIL',
+    'ZM': 'SOYBEAN MEAL',
+    'ZS': 'SOYBEANS'
+}
+
+def fetch_soybean_cot_year(year):
+    # Executado nos processos do pool: devolve só as linhas de soja do ano
+    cot_data = fetch_cot_data(year)
+    year_data = {}
+    if cot_data is not None:
+        year_data = process_cot_data(cot_data)
+        for cot_type, commodity in COMMODITIES.items():
+            if cot_type not in year_data or year_data[cot_type].empty:
+                print(f"No data found for {commodity} in {year}.")
+    else:
+        print(f"Error fetching COT data for {year}.")
+    return year_data
+
+def extract_COT(start_year=2024, workers=1):
+    # workers=None usa um processo por CPU; o padrão roda no próprio processo, já que a atualização
+    # de rotina lê poucos anos do cache e roda numa thread do servidor, onde fork() não é seguro
     current_year = datetime.now().year
-    commodities = {
-        'ZL': 'SOYBEAN OIL',
-        'ZM': 'SOYBEAN MEAL',
-        'ZS': 'SOYBEANS'
-    }
-    
-    all_data = {key: [] for key in commodities.keys()}
-    
-    for year in range(start_year, current_year + 1):
-        cot_data = fetch_cot_data(year)
-        if cot_data is not None:
-            for cot_type, commodity in commodities.items():
-                commodity_df = process_cot_data(cot_data, commodity)
-                if commodity_df is not None and not commodity_df.empty:
-                    all_data[cot_type].append(commodity_df)
-                else:
-                    print(f"No data found for {commodity} in {year}.")
-        else:
-            print(f"Error fetching COT data for {year}.")
-    
+    years = list(range(start_year, current_year + 1))
+    workers = min(workers or os.cpu_count() or 1, len(years))
+
+    if workers > 1:
+        # map preserva a ordem dos anos, então o resultado é determinístico
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(fetch_soybean_cot_year, years))
+    else:
+        results = [fetch_soybean_cot_year(year) for year in years]
+
+    all_data = {key: [] for key in COMMODITIES.keys()}
+    for year_data in results:
+        for cot_type, commodity_df in year_data.items():
+            all_data[cot_type].append(commodity_df)
+
     final_df = pd.DataFrame()
     
     for cot_type, data_list in all_data.items():
@@ -83,7 +119,7 @@ def extract_COT(start_year=2024):
 
 def update_cot_reports():
     try:
-        df_existing = pd.read_parquet('data/cot_soybean_products.parquet')
+        df_existing = read_dataset('cot_soybean_products')
     except FileNotFoundError:
         df_existing = pd.DataFrame()
 
@@ -91,34 +127,153 @@ def update_cot_reports():
     df_combined = pd.concat([df_existing, df_new]).sort_index()
     df_combined = df_combined.drop_duplicates()
     
-    df_combined.to_parquet('data/cot_soybean_products.parquet', index=True)
-    print("COT data for soybean products saved to 'data/cot_soybean_products.parquet'")
+    write_dataset('cot_soybean_products', df_combined)
+    print(f"COT data for soybean products saved to '{dataset_location('cot_soybean_products')}'")
+
+def backfill_cot_reports(start_year=2006, workers=None):
+    # Reconstrução completa do histórico, com os anos processados em paralelo
+    df = extract_COT(start_year=start_year, workers=workers)
+    write_dataset('cot_soybean_products', df)
+    print(f"COT data since {start_year} saved to '{dataset_location('cot_soybean_products')}'")
+
+# Barras repetidas a cada atualização para absorver revisões da última barra
+OVERLAP_BARS = 3
+MAX_BARS = 5000
+
+def last_stored_timestamp(name):
+    # O manifesto já guarda o último timestamp de cada dataset
+    entry = read_manifest().get(name)
+    if entry is not None and entry.get('max_timestamp'):
+        return pd.Timestamp(entry['max_timestamp'])
+
+    # Sem manifesto, lê apenas as estatísticas do parquet, sem carregar os dados
+    path = dataset_path(name)
+    try:
+        metadata = pq.ParquetFile(path).metadata
+    except FileNotFoundError:
+        return None
+
+    last = None
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            column = row_group.column(j)
+            if column.path_in_schema == 'datetime' and column.statistics is not None and column.statistics.has_min_max:
+                value = pd.Timestamp(column.statistics.max)
+                last = value if last is None else max(last, value)
+
+    if last is None:
+        index = pd.read_parquet(path, columns=[]).index
+        last = index.max() if len(index) else None
+    return last
+
+def missing_daily_bars(last_timestamp):
+    if last_timestamp is None:
+        return MAX_BARS
+    today = pd.Timestamp.now().date()
+    missing = int(np.busday_count(last_timestamp.date(), today)) + OVERLAP_BARS
+    return min(max(missing, OVERLAP_BARS), MAX_BARS)
+
+def _utc_bars(df, name):
+    # Só barras com fuso são comparáveis: horários sem fuso dependem da máquina que os gravou
+    if df.index.tz is None:
+        raise ValueError(f"'{name}' has timestamps without timezone; convert it with scripts/migrate_utc.py")
+    return df.tz_convert('UTC')
+
+def upsert_ohlcv(name, df_new):
+    df_new = _utc_bars(df_new, name)
+    try:
+        df_existing = _utc_bars(read_dataset(name), name)
+    except FileNotFoundError:
+        return df_new.sort_index()
+
+    # Barras novas substituem as antigas do mesmo instante em UTC, seja qual for o fuso da máquina
+    df_combined = pd.concat([df_existing, df_new])
+    df_combined = df_combined[~df_combined.index.duplicated(keep='last')]
+    return df_combined.sort_index()
 
 def update_ohlcv_data():
-    tv = TvDatafeed()
-    
     symbols = {
         'ZS': 'ZS1!',
         'ZL': 'ZL1!',
         'ZM': 'ZM1!'
     }
 
+    # Baixar só as barras que faltam desde o último timestamp salvo
+    n_bars = max(
+        missing_daily_bars(last_stored_timestamp(f'{symbol_key}_1D'))
+        for symbol_key in symbols
+    )
+
+    # Uma única conexão autenticada baixa os três símbolos em paralelo
+    with TvDatafeed(pooled=True) as tv:
+        history = tv.get_hist_many(list(symbols.values()), exchange='CBOT', interval=Interval.in_daily, n_bars=n_bars)
+
     for symbol_key, symbol in symbols.items():
-        df_new = tv.get_hist(symbol=symbol, exchange='CBOT', interval=Interval.in_daily, n_bars=5000)
+        df_new = history[symbol]
+        if df_new is None:
+            print(f"No OHLCV data received for {symbol_key}.")
+            continue
         df_new = df_new.drop(['symbol'], axis=1, errors='ignore')
 
-        # try:
-        #     df_existing = pd.read_parquet(f'data/{symbol_key}_1D.parquet')
-        # except FileNotFoundError:
-        #     df_existing = pd.DataFrame()
+        name = f'{symbol_key}_1D'
+        df_combined = upsert_ohlcv(name, df_new)
+        write_dataset(name, df_combined)
+        print(f"OHLCV data for {symbol_key} saved to '{dataset_location(name)}' ({len(df_new)} bars received)")
+
+    # Crush spread e oil share são recalculados aqui, uma vez, e não a cada renderização
+    update_derived_series()
+
+def update_contract_data(roots=None, start_year=None, end_year=None, batch_size=20):
+    """Baixa as barras diárias de cada vencimento (ex.: ZSN2024) para as séries contínuas ajustadas
 
-        # df_combined = pd.concat([df_existing, df_new])
-        # df_combined = df_combined.sort_index()
-        # df_combined = df_combined.drop_duplicates()
+    Por padrão cobre os contratos do ano anterior até dois anos à frente. Contratos que já têm o
+    último pregão no armazenamento não são pedidos de novo.
+    """
+    roots = list(CONTRACT_MONTHS) if roots is None else roots
+    this_year = datetime.now().year
+    start_year = this_year - 1 if start_year is None else start_year
+    end_year = this_year + 2 if end_year is None else end_year
 
-        df_new.to_parquet(f'data/{symbol_key}_1D.parquet', index=True)
-        print(f"OHLCV data for {symbol_key} saved to 'data/{symbol_key}_1D.parquet'")
+    pending = {}
+    for root in roots:
+        for label in listed_contracts(root, start_year, end_year):
+            name = contract_dataset(root, label)
+            last = last_stored_timestamp(name)
+            if last is not None and trading_dates(pd.DatetimeIndex([last]))[0] >= last_trade_date(label):
+                continue
+            pending[contract_symbol(root, label)] = (name, missing_daily_bars(last))
+
+    symbols = list(pending)
+    with TvDatafeed(pooled=True) as tv:
+        for i in range(0, len(symbols), batch_size):
+            batch = symbols[i:i + batch_size]
+            n_bars = max(pending[symbol][1] for symbol in batch)
+            history = tv.get_hist_many(batch, exchange='CBOT', interval=Interval.in_daily, n_bars=n_bars)
+
+            for symbol in batch:
+                name = pending[symbol][0]
+                df_new = history[symbol]
+                if df_new is None:
+                    print(f"No OHLCV data received for {symbol}.")
+                    continue
+                df_new = df_new.drop(['symbol'], axis=1, errors='ignore')
+                write_dataset(name, upsert_ohlcv(name, df_new))
+                print(f"OHLCV data for {symbol} saved to '{dataset_location(name)}' ({len(df_new)} bars received)")
 
 if __name__ == '__main__':
-    update_cot_reports()
-    update_ohlcv_data()
+    # python scripts/update_data.py                    # atualização de rotina
+    # python scripts/update_data.py --backfill-cot 2006  # refaz o COT desde 2006, um processo por CPU
+    parser = argparse.ArgumentParser(description='Atualiza os dados de OHLCV, COT e vencimentos')
+    parser.add_argument('--backfill-cot', nargs='?', type=int, const=2006, metavar='START_YEAR',
+                        help='reconstrói o histórico do COT desde START_YEAR (padrão 2006) e sai')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processos do backfill (padrão: um por CPU)')
+    args = parser.parse_args()
+
+    if args.backfill_cot is not None:
+        backfill_cot_reports(start_year=args.backfill_cot, workers=args.workers)
+    else:
+        update_cot_reports()
+        update_ohlcv_data()
+        update_contract_data()
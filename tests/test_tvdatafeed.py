@@ -0,0 +1,212 @@
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pytest
+from websocket import WebSocketConnectionClosedException
+
+# Adiciona o caminho da raiz do projeto ao sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tvdatafeed_lib.fake import FakeTvServer, make_bars
+from tvdatafeed_lib.main import Interval, TvDatafeed
+from tvdatafeed_lib.stream import BarBuffer, TvStream
+
+
+def ohlcv(bars):
+    return np.array([bar[1:6] if len(bar) > 5 else bar[1:5] + [0.0] for bar in bars])
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+def series_ids(ws):
+    # series ids in subscription order, as sent by TvDatafeed.stream
+    return re.findall(r'"m":"create_series","p":\["\w+","(\w+)"', "".join(ws.sent))
+
+
+@pytest.fixture
+def server():
+    return FakeTvServer(bars=300)
+
+
+def test_pooled_calls_share_one_handshake(server):
+    with TvDatafeed(pooled=True, ws_factory=server.connect) as tv:
+        for _ in range(3):
+            assert len(tv.get_hist("ZS1!", "CBOT", n_bars=50)) == 50
+    assert server.handshakes == 1
+    assert len(server.sockets) == 1
+
+
+def test_unpooled_calls_open_a_connection_each(server):
+    tv = TvDatafeed(ws_factory=server.connect)
+    tv.get_hist("ZS1!", "CBOT", n_bars=10)
+    tv.get_hist("ZS1!", "CBOT", n_bars=10)
+    assert server.handshakes == 2
+    assert tv.ws is None
+
+
+def test_get_hist_many_demultiplexes_series(server):
+    symbols = ["ZS1!", "ZL1!", "ZM1!"]
+    with TvDatafeed(pooled=True, ws_factory=server.connect) as tv:
+        history = tv.get_hist_many(symbols, exchange="CBOT", n_bars=40)
+
+    for symbol in symbols:
+        df = history[symbol]
+        expected = server.history(f"CBOT:{symbol}", "1D")[-40:]
+        assert (df["symbol"] == f"CBOT:{symbol}").all()
+        np.testing.assert_array_equal(df[["open", "high", "low", "close", "volume"]].to_numpy(), ohlcv(expected))
+
+
+def test_bars_are_indexed_in_utc(server, monkeypatch):
+    # the host timezone must not change the stored timestamps
+    monkeypatch.setenv("TZ", "America/Sao_Paulo")
+    time.tzset()
+    try:
+        df = TvDatafeed(ws_factory=server.connect).get_hist("ZS1!", "CBOT", n_bars=5)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    expected = [bar[0] for bar in server.history("CBOT:ZS1!", "1D")[-5:]]
+    assert str(df.index.tz) == "UTC"
+    assert (df.index.asi8 // 10 ** 9).tolist() == expected
+
+
+def test_bars_without_volume_get_zero_volume():
+    server = FakeTvServer(bars=20, no_volume=["CBOT:ZS1!"])
+    df = TvDatafeed(ws_factory=server.connect).get_hist("ZS1!", "CBOT", n_bars=20)
+    assert len(make_bars("CBOT:ZS1!", volume=False)[0]) == 5
+    assert (df["volume"] == 0.0).all()
+    assert df["close"].notna().all()
+
+
+def test_get_hist_range_pages_back_to_start(server):
+    with TvDatafeed(pooled=True, ws_factory=server.connect) as tv:
+        full = tv.get_hist("ZS1!", "CBOT", interval=Interval.in_1_hour, n_bars=300)
+        start = full.index[25]
+        df = tv.get_hist_range("ZS1!", start, "CBOT", interval=Interval.in_1_hour, page_bars=40)
+
+    assert df.index[0] == start
+    assert df.index.is_unique and df.index.is_monotonic_increasing
+    assert df.equals(full.iloc[25:])
+    # 275 bars in pages of 40: create_series plus 6 request_more_data, all on the same socket
+    assert sum('"m":"request_more_data"' in raw for raw in server.sockets[0].sent) == 6
+
+
+def test_closed_fake_socket_refuses_writes(server):
+    ws = server.connect("wss://fake")
+    ws.close()
+    with pytest.raises(WebSocketConnectionClosedException):
+        ws.send("~m~4~m~~h~1")
+    with pytest.raises(ConnectionResetError):
+        ws.recv()
+
+
+def test_pooled_socket_reconnects_after_drop(server):
+    with TvDatafeed(pooled=True, ws_factory=server.connect) as tv:
+        tv.get_hist("ZS1!", "CBOT", n_bars=10)
+        # the server drops the idle socket; the next calls reconnect once and keep working
+        server.sockets[-1].close()
+        for _ in range(3):
+            assert len(tv.get_hist("ZS1!", "CBOT", n_bars=10)) == 10
+    assert server.handshakes == 2
+
+
+def test_reconnect_gives_up_after_second_failure(server):
+    def refuse(url, headers=None, timeout=None):
+        ws = server.connect(url)
+        ws.close()
+        return ws
+
+    tv = TvDatafeed(pooled=True, ws_factory=refuse)
+    with pytest.raises(WebSocketConnectionClosedException):
+        tv.get_hist("ZS1!", "CBOT", n_bars=10)
+    assert tv.ws is None
+
+
+def test_heartbeat_echo_leaves_data_packets_out():
+    class Socket:
+        sent = []
+
+        def recv(self):
+            return '~m~4~m~~h~7~m~20~m~{"m":"du","p":[1,2]}'
+
+        def send(self, raw):
+            self.sent.append(raw)
+
+    tv = TvDatafeed()
+    tv.ws = Socket()
+    tv._TvDatafeed__recv()
+    assert tv.ws.sent == ["~m~4~m~~h~7"]
+
+
+@pytest.fixture
+def stream(server):
+    stream = TvStream(["ZS1!", "ZL1!"], exchange="CBOT", history_bars=50, reconnect_delay=0.05,
+                      ws_factory=server.connect)
+    yield stream.start()
+    stream.stop(timeout=5)
+
+
+def test_stream_fills_history(server, stream):
+    wait_for(lambda: all(len(buffer) == 50 for buffer in stream.buffers.values()))
+    for symbol in stream.symbols:
+        expected = server.history(f"CBOT:{symbol}", "1D")[-50:]
+        df = stream.latest(symbol)
+        assert (df.index.asi8 // 10 ** 9).tolist() == [bar[0] for bar in expected]
+        np.testing.assert_array_equal(df.to_numpy(), ohlcv(expected))
+
+
+def test_stream_du_updates_last_bar_and_appends(server, stream):
+    wait_for(lambda: len(stream.buffers["ZS1!"]) == 50)
+    ws = server.sockets[-1]
+    zs = series_ids(ws)[0]
+    last = server.history("CBOT:ZS1!", "1D")[-1]
+
+    revised = [last[0], last[1], last[2] + 5, last[3], last[4] + 1, last[5] + 100]
+    ws.push_update(zs, revised)
+    wait_for(lambda: stream.latest("ZS1!", 1)["close"].iloc[0] == revised[4])
+    assert len(stream.buffers["ZS1!"]) == 50
+
+    new = [last[0] + 86400, 1.0, 2.0, 0.5, 1.5, 10.0]
+    ws.push_update(zs, new)
+    wait_for(lambda: len(stream.buffers["ZS1!"]) == 51)
+    np.testing.assert_array_equal(stream.buffers["ZS1!"].values(2), [revised, new])
+    # the other symbol is untouched
+    assert len(stream.buffers["ZL1!"]) == 50
+
+
+def test_bar_buffer_wraps_at_capacity():
+    buffer = BarBuffer(capacity=5)
+    bars = [[1000 + i, i, i + 1, i - 1, i + 0.5, 10 * i] for i in range(8)]
+    for bar in bars:
+        buffer.update(bar)
+    assert len(buffer) == 5
+    np.testing.assert_array_equal(buffer.values(), bars[-5:])
+    np.testing.assert_array_equal(buffer.values(2), bars[-2:])
+    # an update of the newest bar replaces it in place, older bars are ignored
+    buffer.update([1007, 7, 9, 6, 8, 99])
+    buffer.update(bars[0])
+    np.testing.assert_array_equal(buffer.values(1), [[1007, 7, 9, 6, 8, 99]])
+    assert buffer.to_frame().index.is_monotonic_increasing
+
+
+def test_stream_resubscribes_after_drop(server, stream):
+    wait_for(lambda: len(stream.buffers["ZS1!"]) == 50)
+    server.sockets[-1].close()
+    wait_for(lambda: stream.reconnects >= 1 and len(server.sockets) == 2 and series_ids(server.sockets[-1]))
+    assert server.handshakes == 2
+
+    last = server.history("CBOT:ZS1!", "1D")[-1]
+    new = [last[0] + 86400, 1.0, 2.0, 0.5, 1.5, 10.0]
+    server.sockets[-1].push_update(series_ids(server.sockets[-1])[0], new)
+    wait_for(lambda: len(stream.buffers["ZS1!"]) == 51)
+    # the history sent again on resubscribe did not duplicate bars
+    assert stream.latest("ZS1!").index.is_unique
@@ -1,3 +1,4 @@
 from .main import TvDatafeed, Interval
+from .stream import TvStream, BarBuffer
 
 __version__ = "2.1.0"
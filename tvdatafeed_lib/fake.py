@@ -0,0 +1,200 @@
+"""In-process stand-in for the TradingView websocket, for offline runs.
+
+    server = FakeTvServer()
+    with TvDatafeed(pooled=True, ws_factory=server.connect) as tv:
+        tv.get_hist("ZS1!", "CBOT", n_bars=100)
+    server.handshakes  # -> 1
+"""
+import json
+import random
+import re
+import threading
+import zlib
+
+from websocket import WebSocketConnectionClosedException
+
+_INTERVAL_SECONDS = {
+    "1": 60,
+    "3": 180,
+    "5": 300,
+    "15": 900,
+    "30": 1800,
+    "45": 2700,
+    "1H": 3600,
+    "2H": 7200,
+    "3H": 10800,
+    "4H": 14400,
+    "1D": 86400,
+    "1W": 604800,
+    "1M": 2592000,
+}
+
+
+def frame(payload: str) -> str:
+    return "~m~" + str(len(payload)) + "~m~" + payload
+
+
+def message(func, param_list) -> str:
+    return frame(json.dumps({"m": func, "p": param_list}, separators=(",", ":")))
+
+
+def split_frames(raw: str):
+    """split a websocket frame into its ~m~len~m~ packets"""
+    packets = []
+    pos = 0
+    while raw.startswith("~m~", pos):
+        head_end = raw.index("~m~", pos + 3)
+        size = int(raw[pos + 3:head_end])
+        start = head_end + 3
+        packets.append(raw[start:start + size])
+        pos = start + size
+    return packets
+
+
+def make_bars(symbol, interval="1D", count=10, end=1718917200, volume=True):
+    """deterministic synthetic bars for symbol, oldest first, last bar at end"""
+    step = _INTERVAL_SECONDS[interval]
+    rng = random.Random(zlib.crc32(f"{symbol}:{interval}".encode()))
+    price = 1000.0
+    bars = []
+    for i in range(count):
+        ts = float(end - (count - 1 - i) * step)
+        open_ = price
+        close = max(1.0, open_ + rng.uniform(-10, 10))
+        high = max(open_, close) + rng.uniform(0, 5)
+        low = min(open_, close) - rng.uniform(0, 5)
+        bar = [ts, round(open_, 2), round(high, 2), round(low, 2), round(close, 2)]
+        if volume:
+            bar.append(float(rng.randint(100, 100000)))
+        bars.append(bar)
+        price = close
+    return bars
+
+
+class FakeTvSocket:
+    """one fake websocket connection, created by FakeTvServer.connect"""
+
+    def __init__(self, server):
+        self.server = server
+        self.sent = []
+        self.connected = True
+        self.__ready = threading.Condition()
+        self.__queue = [frame("~h~1")]
+        self.__symbols = {}
+        self.__series = {}
+
+    def send(self, raw):
+        # like websocket-client, a closed (or dropped) socket refuses writes
+        if not self.connected:
+            raise WebSocketConnectionClosedException("socket is already closed.")
+        self.sent.append(raw)
+        for packet in split_frames(raw):
+            if packet.startswith("~h~"):
+                continue
+            msg = json.loads(packet)
+            handler = getattr(self, "_on_" + msg["m"], None)
+            if handler is not None:
+                handler(*msg["p"])
+
+    def recv(self):
+        with self.__ready:
+            if self.connected and not self.__queue:
+                self.__ready.wait(self.server.recv_timeout)
+            if not self.connected:
+                raise ConnectionResetError("fake socket is closed")
+            if not self.__queue:
+                raise TimeoutError("fake socket has nothing to send")
+            return self.__queue.pop(0)
+
+    def close(self):
+        with self.__ready:
+            self.connected = False
+            self.__ready.notify_all()
+
+    def __put(self, raw):
+        with self.__ready:
+            self.__queue.append(raw)
+            self.__ready.notify_all()
+
+    def _on_set_auth_token(self, token):
+        self.server.handshakes += 1
+
+    def _on_resolve_symbol(self, chart_session, symbol_id, spec):
+        symbol = json.loads(spec[1:])["symbol"]
+        self.__symbols[symbol_id] = symbol
+        self.__put(message(
+            "symbol_resolved", [chart_session, symbol_id, {"pro_name": symbol}]))
+
+    def _on_create_series(self, chart_session, series_id, turnaround, symbol_id, interval, n_bars, *args):
+        symbol = self.__symbols[symbol_id]
+        available = self.server.history(symbol, interval)
+        bars = available[-n_bars:] if n_bars else []
+        self.__series[series_id] = (symbol, interval, len(available) - len(bars))
+        self.__put(message(
+            "series_loading", [chart_session, series_id, turnaround]))
+        self.__send_bars(chart_session, series_id, bars)
+
+    _on_modify_series = _on_create_series
+
+    def _on_request_more_data(self, chart_session, series_id, n_bars):
+        symbol, interval, first = self.__series[series_id]
+        available = self.server.history(symbol, interval)
+        start = max(0, first - n_bars)
+        self.__series[series_id] = (symbol, interval, start)
+        self.__send_bars(chart_session, series_id, available[start:first])
+
+    def _on_remove_series(self, chart_session, series_id):
+        self.__series.pop(series_id, None)
+
+    def __send_bars(self, chart_session, series_id, bars):
+        points = [{"i": i, "v": bar} for i, bar in enumerate(bars)]
+        self.__put(message(
+            "timescale_update",
+            [chart_session, {series_id: {"node": "fake", "s": points, "t": series_id}}],
+        ))
+        self.__put(message(
+            "series_completed", [chart_session, series_id, "streaming"]))
+
+    def push_update(self, series_id, bar):
+        """queue a live "du" bar update for series_id"""
+        chart_session = self.server.chart_session_of(self)
+        self.__put(message(
+            "du", [chart_session, {series_id: {"s": [{"i": 0, "v": bar}]}}]))
+
+
+class FakeTvServer:
+    """serves synthetic history to any number of FakeTvSocket connections
+
+    Args:
+        bars (int, optional): history depth available per symbol and interval. Defaults to 20000.
+        no_volume (tuple, optional): symbols whose bars are sent without volume. Defaults to ().
+        recv_timeout (float, optional): seconds recv waits for data before raising TimeoutError. Defaults to 0.1.
+    """
+
+    def __init__(self, bars: int = 20000, no_volume=(), recv_timeout: float = 0.1):
+        self.bars = bars
+        self.recv_timeout = recv_timeout
+        self.no_volume = set(no_volume)
+        self.handshakes = 0
+        self.sockets = []
+        self.__history = {}
+
+    def connect(self, url, headers=None, timeout=None):
+        ws = FakeTvSocket(self)
+        self.sockets.append(ws)
+        return ws
+
+    def history(self, symbol, interval):
+        key = (symbol, interval)
+        if key not in self.__history:
+            self.__history[key] = make_bars(
+                symbol, interval, self.bars, volume=symbol not in self.no_volume)
+        return self.__history[key]
+
+    @staticmethod
+    def chart_session_of(ws):
+        for raw in ws.sent:
+            found = re.search(r'"m":"chart_create_session","p":\["(cs_\w+)"', raw)
+            if found:
+                return found.group(1)
+        return "cs_fake"
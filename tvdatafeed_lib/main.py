@@ -1,17 +1,37 @@
-import datetime
 import enum
+import itertools
 import json
 import logging
 import random
 import re
 import string
+import threading
+import numpy as np
 import pandas as pd
-from websocket import create_connection
+from websocket import create_connection, WebSocketConnectionClosedException, WebSocketTimeoutException
 import requests
 import json
 
 logger = logging.getLogger(__name__)
 
+# errors of a socket the server (or the network) already dropped, e.g. an idle
+# pooled socket whose heartbeats went unanswered
+CONNECTION_ERRORS = (WebSocketConnectionClosedException, ConnectionError)
+
+
+def bar_values(point):
+    """[ts, o, h, l, c, v] of a series point, volume 0.0 when not sent"""
+    v = point["v"]
+    return v[:6] if len(v) >= 6 and v[5] is not None else v[:5] + [0.0]
+
+
+def utc_index(timestamps):
+    """tz-aware UTC index of epoch seconds, the same on every host whatever its
+    local timezone; convert with tz_convert to show exchange or local time"""
+    timestamps = np.asarray(timestamps).astype(np.int64)
+    index = pd.to_datetime(timestamps, unit="s", utc=True)
+    return pd.Index(index.as_unit("ns"), name="datetime")
+
 
 class Interval(enum.Enum):
     in_1_minute = "1"
@@ -34,21 +54,28 @@ class TvDatafeed:
     __search_url = 'https://symbol-search.tradingview.com/symbol_search/?text={}&hl=1&exchange={}&lang=en&type=&domain=production'
     __ws_headers = json.dumps({"Origin": "https://data.tradingview.com"})
     __signin_headers = {'Referer': 'https://www.tradingview.com'}
+    __ws_url = "wss://data.tradingview.com/socket.io/websocket"
     __ws_timeout = 5
 
     def __init__(
         self,
         username: str = None,
         password: str = None,
+        pooled: bool = False,
+        ws_factory=None,
     ) -> None:
         """Create TvDatafeed object
 
         Args:
             username (str, optional): tradingview username. Defaults to None.
             password (str, optional): tradingview password. Defaults to None.
+            pooled (bool, optional): keep one authenticated websocket and chart session open and reuse it for every get_hist call until close() is called. Defaults to False.
+            ws_factory (callable, optional): replacement for websocket.create_connection, e.g. a fake socket for offline runs. Defaults to None.
         """
 
         self.ws_debug = False
+        self.pooled = pooled
+        self.ws_factory = ws_factory or create_connection
 
         self.token = self.__auth(username, password)
 
@@ -61,6 +88,23 @@ class TvDatafeed:
         self.ws = None
         self.session = self.__generate_session()
         self.chart_session = self.__generate_chart_session()
+        self.__series_counter = 0
+        self.__lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """close the websocket, if any. A later get_hist call opens a new one"""
+        if self.ws is not None:
+            try:
+                self.ws.close()
+            except Exception as e:
+                logger.debug(e)
+            self.ws = None
 
     def __auth(self, username, password):
 
@@ -83,9 +127,170 @@ class TvDatafeed:
 
     def __create_connection(self):
         logging.debug("creating websocket connection")
-        self.ws = create_connection(
-            "wss://data.tradingview.com/socket.io/websocket", headers=self.__ws_headers, timeout=self.__ws_timeout
+        self.ws = self.ws_factory(
+            self.__ws_url, headers=self.__ws_headers, timeout=self.__ws_timeout
+        )
+
+    def __open_session(self):
+        """connect and run the auth, chart session and quote session handshake"""
+        self.__create_connection()
+
+        self.__send_message("set_auth_token", [self.token])
+        self.__send_message("chart_create_session", [self.chart_session, ""])
+        self.__send_message("quote_create_session", [self.session])
+        self.__send_message(
+            "quote_set_fields",
+            [
+                self.session,
+                "ch",
+                "chp",
+                "current_session",
+                "description",
+                "local_description",
+                "language",
+                "exchange",
+                "fractional",
+                "is_tradable",
+                "lp",
+                "lp_time",
+                "minmov",
+                "minmove2",
+                "original_name",
+                "pricescale",
+                "pro_name",
+                "short_name",
+                "type",
+                "update_mode",
+                "volume",
+                "currency_code",
+                "rchp",
+                "rtc",
+            ],
+        )
+        self.__send_message("switch_timezone", [
+                            self.chart_session, "exchange"])
+
+    def __ensure_session(self):
+        # in pooled mode the authenticated socket is reused between calls
+        if self.ws is None or not self.pooled:
+            self.close()
+            self.__open_session()
+
+    def __with_reconnect(self, request):
+        """run request() on the open session, reconnecting once if the socket is dead
+
+        A pooled socket is only known to be dropped when a send or recv on it
+        fails, so the first failure closes it and repeats the request on a new
+        connection; a second failure is raised to the caller.
+        """
+        for attempt in range(2):
+            try:
+                self.__ensure_session()
+                return request()
+            except CONNECTION_ERRORS as e:
+                self.close()
+                if attempt:
+                    raise
+                logger.warning(f"websocket connection lost ({e!r}), reconnecting")
+
+    def __next_series_id(self):
+        self.__series_counter += 1
+        return f"s{self.__series_counter}", f"symbol_{self.__series_counter}"
+
+    def __recv(self):
+        """receive one frame, answering heartbeats so a pooled socket stays alive"""
+        result = self.ws.recv()
+        if "~h~" in result:
+            # only the heartbeat goes back, not the data packets sharing its frame
+            for packet in self.__split_frames(result):
+                if packet.startswith("~h~"):
+                    self.ws.send(self.__prepend_header(packet))
+        return result
+
+    @staticmethod
+    def __split_frames(raw):
+        """split a websocket frame into its ~m~len~m~ packets"""
+        packets = []
+        pos = 0
+        while raw.startswith("~m~", pos):
+            head_end = raw.index("~m~", pos + 3)
+            size = int(raw[pos + 3:head_end])
+            start = head_end + 3
+            packets.append(raw[start:start + size])
+            pos = start + size
+        return packets
+
+    def __request_series(self, symbol, interval, n_bars, extended_session):
+        series_id, symbol_id = self.__next_series_id()
+
+        self.__send_message(
+            "quote_add_symbols", [self.session, symbol,
+                                  {"flags": ["force_permission"]}]
+        )
+        self.__send_message("quote_fast_symbols", [self.session, symbol])
+
+        self.__send_message(
+            "resolve_symbol",
+            [
+                self.chart_session,
+                symbol_id,
+                '={"symbol":"'
+                + symbol
+                + '","adjustment":"splits","session":'
+                + ('"regular"' if not extended_session else '"extended"')
+                + "}",
+            ],
+        )
+        self.__send_message(
+            "create_series",
+            [self.chart_session, series_id, series_id, symbol_id, interval, n_bars],
         )
+        return series_id, symbol_id
+
+    def __collect_series(self, symbol_ids):
+        """read until every requested series completes, demultiplexed by series id
+
+        Args:
+            symbol_ids (dict): symbol id of each pending series id
+
+        Returns:
+            tuple: list of bar points by series id, True if every series completed
+        """
+        points = {series_id: [] for series_id in symbol_ids}
+        series_of = {symbol_id: series_id for series_id,
+                     symbol_id in symbol_ids.items()}
+        pending = set(symbol_ids)
+
+        while pending:
+            try:
+                result = self.__recv()
+            except CONNECTION_ERRORS:
+                raise
+            except Exception as e:
+                logger.error(e)
+                return points, False
+
+            for packet in self.__split_frames(result):
+                if packet.startswith("~h~"):
+                    continue
+                try:
+                    msg = json.loads(packet)
+                except ValueError:
+                    continue
+                func, params = msg.get("m"), msg.get("p", [])
+
+                if func == "timescale_update":
+                    # "du" updates of other series of this session are skipped
+                    for series_id, series in params[1].items():
+                        if series_id in pending:
+                            points[series_id].extend(series.get("s", []))
+                elif func == "series_completed":
+                    pending.discard(params[1])
+                elif func in ("symbol_error", "series_error"):
+                    logger.error(f"{func}: {params[1:]}")
+                    pending.discard(series_of.get(params[1], params[1]))
+
+        return points, True
 
     @staticmethod
     def __filter_raw_message(text):
@@ -131,43 +336,29 @@ class TvDatafeed:
         self.ws.send(m)
 
     @staticmethod
-    def __create_df(raw_data, symbol):
-        try:
-            out = re.search('"s":\[(.+?)\}\]', raw_data).group(1)
-            x = out.split(',{"')
-            data = list()
-            volume_data = True
-
-            for xi in x:
-                xi = re.split("\[|:|,|\]", xi)
-                ts = datetime.datetime.fromtimestamp(float(xi[4]))
-
-                row = [ts]
-
-                for i in range(5, 10):
-
-                    # skip converting volume data if does not exists
-                    if not volume_data and i == 9:
-                        row.append(0.0)
-                        continue
-                    try:
-                        row.append(float(xi[i]))
-
-                    except ValueError:
-                        volume_data = False
-                        row.append(0.0)
-                        logger.debug('no volume data')
-
-                data.append(row)
-
-            data = pd.DataFrame(
-                data, columns=["datetime", "open",
-                               "high", "low", "close", "volume"]
-            ).set_index("datetime")
-            data.insert(0, "symbol", value=symbol)
-            return data
-        except AttributeError:
+    def __create_df(points, symbol):
+        n_rows = len(points)
+        if n_rows == 0:
             logger.error("no data, please check the exchange and symbol")
+            return None
+
+        # bars without volume come as [ts, o, h, l, c] or with a null volume
+        flat = itertools.chain.from_iterable(map(bar_values, points))
+        columns = np.fromiter(flat, dtype=np.float64,
+                              count=n_rows * 6).reshape(n_rows, 6).T
+
+        data = pd.DataFrame(
+            {
+                "symbol": symbol,
+                "open": columns[1],
+                "high": columns[2],
+                "low": columns[3],
+                "close": columns[4],
+                "volume": columns[5],
+            },
+            index=utc_index(columns[0]),
+        )
+        return data
 
     @staticmethod
     def __format_symbol(symbol, exchange, contract: int = None):
@@ -200,94 +391,222 @@ class TvDatafeed:
             symbol (str): symbol name
             exchange (str, optional): exchange, not required if symbol is in format EXCHANGE:SYMBOL. Defaults to None.
             interval (str, optional): chart interval. Defaults to 'D'.
-            n_bars (int, optional): no of bars to download, max 5000. Defaults to 10.
+            n_bars (int, optional): no of bars to download, max 5000, use get_hist_range for deeper history. Defaults to 10.
             fut_contract (int, optional): None for cash, 1 for continuous current contract in front, 2 for continuous next contract in front . Defaults to None.
             extended_session (bool, optional): regular session if False, extended session if True, Defaults to False.
 
         Returns:
-            pd.Dataframe: dataframe with sohlcv as columns
+            pd.Dataframe: dataframe with sohlcv as columns, indexed by bar time in UTC
         """
-        symbol = self.__format_symbol(
-            symbol=symbol, exchange=exchange, contract=fut_contract
-        )
+        return self.get_hist_many(
+            [symbol],
+            exchange=exchange,
+            interval=interval,
+            n_bars=n_bars,
+            fut_contract=fut_contract,
+            extended_session=extended_session,
+        )[symbol]
+
+    def get_hist_many(
+        self,
+        symbols: list,
+        exchange: str = "NSE",
+        interval: Interval = Interval.in_daily,
+        n_bars: int = 10,
+        fut_contract: int = None,
+        extended_session: bool = False,
+    ) -> dict:
+        """get historical data for several symbols at once
 
+        Every symbol gets its own series on the chart session and all of them
+        are requested before reading, so the download takes about as long as
+        the slowest series instead of the sum.
+
+        Args:
+            symbols (list): symbol names
+            exchange (str, optional): exchange, not required if symbols are in format EXCHANGE:SYMBOL. Defaults to None.
+            interval (str, optional): chart interval. Defaults to 'D'.
+            n_bars (int, optional): no of bars to download per symbol, max 5000. Defaults to 10.
+            fut_contract (int, optional): None for cash, 1 for continuous current contract in front, 2 for continuous next contract in front . Defaults to None.
+            extended_session (bool, optional): regular session if False, extended session if True, Defaults to False.
+
+        Returns:
+            dict: dataframe with sohlcv as columns for each requested symbol
+        """
         interval = interval.value
+        requested = {}
+
+        def request():
+            requested.clear()
+            for name in symbols:
+                symbol = self.__format_symbol(
+                    symbol=name, exchange=exchange, contract=fut_contract
+                )
+                logger.debug(f"getting data for {symbol}...")
+                series_id, symbol_id = self.__request_series(
+                    symbol, interval, n_bars, extended_session)
+                requested[series_id] = (name, symbol, symbol_id)
+
+            points, completed = self.__collect_series(
+                {series_id: symbol_id for series_id, (_, _, symbol_id) in requested.items()})
+
+            if self.pooled and completed:
+                # stop streaming the series so they do not leak into later requests
+                for series_id in requested:
+                    self.__send_message(
+                        "remove_series", [self.chart_session, series_id])
+            else:
+                self.close()
+            return points
+
+        with self.__lock:
+            points = self.__with_reconnect(request)
+
+        return {
+            name: self.__create_df(points[series_id], symbol)
+            for series_id, (name, symbol, _) in requested.items()
+        }
+
+    def get_hist_range(
+        self,
+        symbol: str,
+        start,
+        exchange: str = "NSE",
+        interval: Interval = Interval.in_daily,
+        fut_contract: int = None,
+        extended_session: bool = False,
+        page_bars: int = 5000,
+    ) -> pd.DataFrame:
+        """get historical data back to a start date, beyond the 5000 bars limit
 
-        self.__create_connection()
+        The series is extended backward with request_more_data on the same
+        chart session, one page of page_bars at a time, until start is
+        reached or the server has no older bars. Each page is converted to
+        columns as it arrives and only its bars older than the previous
+        pages are kept.
 
-        self.__send_message("set_auth_token", [self.token])
-        self.__send_message("chart_create_session", [self.chart_session, ""])
-        self.__send_message("quote_create_session", [self.session])
-        self.__send_message(
-            "quote_set_fields",
-            [
-                self.session,
-                "ch",
-                "chp",
-                "current_session",
-                "description",
-                "local_description",
-                "language",
-                "exchange",
-                "fractional",
-                "is_tradable",
-                "lp",
-                "lp_time",
-                "minmov",
-                "minmove2",
-                "original_name",
-                "pricescale",
-                "pro_name",
-                "short_name",
-                "type",
-                "update_mode",
-                "volume",
-                "currency_code",
-                "rchp",
-                "rtc",
-            ],
-        )
+        Args:
+            symbol (str): symbol name
+            start (datetime or str): oldest bar wanted, UTC when it has no timezone
+            exchange (str, optional): exchange, not required if symbol is in format EXCHANGE:SYMBOL. Defaults to None.
+            interval (str, optional): chart interval. Defaults to 'D'.
+            fut_contract (int, optional): None for cash, 1 for continuous current contract in front, 2 for continuous next contract in front . Defaults to None.
+            extended_session (bool, optional): regular session if False, extended session if True, Defaults to False.
+            page_bars (int, optional): bars requested per page, max 5000. Defaults to 5000.
 
-        self.__send_message(
-            "quote_add_symbols", [self.session, symbol,
-                                  {"flags": ["force_permission"]}]
+        Returns:
+            pd.Dataframe: dataframe with sohlcv as columns, indexed by bar time in UTC
+        """
+        start = pd.Timestamp(start)
+        start = start.tz_localize("UTC") if start.tz is None else start.tz_convert("UTC")
+        symbol = self.__format_symbol(
+            symbol=symbol, exchange=exchange, contract=fut_contract
         )
-        self.__send_message("quote_fast_symbols", [self.session, symbol])
+        pages = []
+
+        def request():
+            pages.clear()
+            oldest = None
+            series_id, symbol_id = self.__request_series(
+                symbol, interval.value, page_bars, extended_session)
+
+            while True:
+                points, completed = self.__collect_series(
+                    {series_id: symbol_id})
+                if not completed or not points[series_id]:
+                    break
+
+                page = self.__create_df(points[series_id], symbol)
+                if oldest is not None:
+                    page = page[page.index < oldest]
+                if page.empty:
+                    break
+
+                pages.append(page)
+                oldest = page.index[0]
+                logger.debug(f"{symbol}: history back to {oldest}")
+                if oldest <= start:
+                    break
+
+                self.__send_message(
+                    "request_more_data", [self.chart_session, series_id, page_bars])
+
+            if self.pooled and completed:
+                self.__send_message(
+                    "remove_series", [self.chart_session, series_id])
+            else:
+                self.close()
+
+        with self.__lock:
+            self.__with_reconnect(request)
+
+        if not pages:
+            logger.error("no data, please check the exchange and symbol")
+            return None
 
-        self.__send_message(
-            "resolve_symbol",
-            [
-                self.chart_session,
-                "symbol_1",
-                '={"symbol":"'
-                + symbol
-                + '","adjustment":"splits","session":'
-                + ('"regular"' if not extended_session else '"extended"')
-                + "}",
-            ],
-        )
-        self.__send_message(
-            "create_series",
-            [self.chart_session, "s1", "s1", "symbol_1", interval, n_bars],
-        )
-        self.__send_message("switch_timezone", [
-                            self.chart_session, "exchange"])
+        data = pd.concat(pages[::-1]).sort_index()
+        data = data[~data.index.duplicated(keep="last")]
+        return data[data.index >= start]
 
-        raw_data = ""
+    def stream(
+        self,
+        symbols: list,
+        exchange: str = "NSE",
+        interval: Interval = Interval.in_daily,
+        n_bars: int = 10,
+        fut_contract: int = None,
+        extended_session: bool = False,
+    ):
+        """subscribe to live bars, yielding (symbol, [ts, o, h, l, c, v])
 
-        logger.debug(f"getting data for {symbol}...")
-        while True:
-            try:
-                result = self.ws.recv()
-                raw_data = raw_data + result + "\n"
-            except Exception as e:
-                logger.error(e)
-                break
+        The last n_bars of history are yielded first, then every "du" update
+        as it arrives; an update of the last bar repeats its timestamp. The
+        socket is owned by the generator until it is closed, so use a
+        dedicated TvDatafeed per stream. Read timeouts are not errors here,
+        a dropped connection is raised to the caller.
+
+        Args:
+            symbols (list): symbol names
+            exchange (str, optional): exchange, not required if symbols are in format EXCHANGE:SYMBOL. Defaults to None.
+            interval (str, optional): chart interval. Defaults to 'D'.
+            n_bars (int, optional): bars of history sent before the live updates, max 5000. Defaults to 10.
+            fut_contract (int, optional): None for cash, 1 for continuous current contract in front, 2 for continuous next contract in front . Defaults to None.
+            extended_session (bool, optional): regular session if False, extended session if True, Defaults to False.
+        """
+        names = {}
+
+        with self.__lock:
+            self.__ensure_session()
+            for name in symbols:
+                symbol = self.__format_symbol(
+                    symbol=name, exchange=exchange, contract=fut_contract
+                )
+                series_id, _ = self.__request_series(
+                    symbol, interval.value, n_bars, extended_session)
+                names[series_id] = name
 
-            if "series_completed" in result:
-                break
+            try:
+                while True:
+                    try:
+                        result = self.__recv()
+                    except (WebSocketTimeoutException, TimeoutError):
+                        continue
 
-        return self.__create_df(raw_data, symbol)
+                    for packet in self.__split_frames(result):
+                        if packet.startswith("~h~"):
+                            continue
+                        try:
+                            msg = json.loads(packet)
+                        except ValueError:
+                            continue
+                        if msg.get("m") not in ("timescale_update", "du"):
+                            continue
+                        for series_id, series in msg["p"][1].items():
+                            if series_id in names:
+                                for point in series.get("s", []):
+                                    yield names[series_id], bar_values(point)
+            finally:
+                self.close()
 
     def search_symbol(self, text: str, exchange: str = ''):
         url = self.__search_url.format(text, exchange)
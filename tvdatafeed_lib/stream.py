@@ -0,0 +1,153 @@
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .main import TvDatafeed, Interval, utc_index
+
+logger = logging.getLogger(__name__)
+
+
+class BarBuffer:
+    """fixed-size ring buffer of the latest [ts, o, h, l, c, v] bars of one symbol
+
+    Args:
+        capacity (int, optional): bars kept, the oldest is overwritten when full. Defaults to 5000.
+    """
+
+    columns = ["open", "high", "low", "close", "volume"]
+
+    def __init__(self, capacity: int = 5000) -> None:
+        self.capacity = capacity
+        self.version = 0
+        self.__data = np.zeros((capacity, 6), dtype=np.float64)
+        self.__start = 0
+        self.__size = 0
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return self.__size
+
+    def update(self, bar):
+        """append a new bar or update the last one in place, older bars are ignored"""
+        with self.__lock:
+            last = (self.__start + self.__size - 1) % self.capacity
+            if self.__size and bar[0] < self.__data[last, 0]:
+                return
+            if self.__size and bar[0] == self.__data[last, 0]:
+                self.__data[last] = bar
+            elif self.__size < self.capacity:
+                self.__data[(self.__start + self.__size) % self.capacity] = bar
+                self.__size += 1
+            else:
+                self.__data[self.__start] = bar
+                self.__start = (self.__start + 1) % self.capacity
+            self.version += 1
+
+    def values(self, n_bars: int = None) -> np.ndarray:
+        """copy of the latest n_bars (all by default), oldest first"""
+        with self.__lock:
+            n_bars = self.__size if n_bars is None else min(n_bars, self.__size)
+            first = self.__start + self.__size - n_bars
+            rows = np.arange(first, first + n_bars) % self.capacity
+            return self.__data[rows]
+
+    def to_frame(self, n_bars: int = None) -> pd.DataFrame:
+        """latest bars as an ohlcv dataframe indexed like TvDatafeed.get_hist"""
+        values = self.values(n_bars)
+        return pd.DataFrame(values[:, 1:], columns=self.columns,
+                            index=utc_index(values[:, 0]))
+
+
+class TvStream:
+    """keeps a live subscription in a background thread, filling one BarBuffer per symbol
+
+    The reader thread only writes into the ring buffers, which never block,
+    so slow readers cannot hold up the socket. If the connection drops the
+    series are subscribed again after reconnect_delay seconds, with
+    history_bars of history to fill the gap.
+
+    Args:
+        symbols (list): symbol names
+        exchange (str, optional): exchange, not required if symbols are in format EXCHANGE:SYMBOL. Defaults to "NSE".
+        interval (Interval, optional): chart interval. Defaults to Interval.in_daily.
+        capacity (int, optional): bars kept per symbol. Defaults to 5000.
+        history_bars (int, optional): history requested on every (re)subscribe. Defaults to 100.
+        reconnect_delay (float, optional): seconds to wait before reconnecting. Defaults to 5.
+        **kwargs: fut_contract and extended_session for TvDatafeed.stream, username, password and ws_factory for TvDatafeed
+    """
+
+    def __init__(
+        self,
+        symbols: list,
+        exchange: str = "NSE",
+        interval: Interval = Interval.in_daily,
+        capacity: int = 5000,
+        history_bars: int = 100,
+        reconnect_delay: float = 5,
+        **kwargs,
+    ) -> None:
+        self.symbols = list(symbols)
+        self.exchange = exchange
+        self.interval = interval
+        self.history_bars = history_bars
+        self.reconnect_delay = reconnect_delay
+        self.buffers = {symbol: BarBuffer(capacity) for symbol in self.symbols}
+        self.reconnects = 0
+
+        self.__stream_kwargs = {key: kwargs.pop(key) for key in ("fut_contract", "extended_session") if key in kwargs}
+        self.__tv_kwargs = kwargs
+        self.__tv = None
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        if self.__thread is None or not self.__thread.is_alive():
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.__run, name="tv-stream", daemon=True)
+            self.__thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        self.__stop.set()
+        if self.__tv is not None:
+            self.__tv.close()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+    def latest(self, symbol, n_bars: int = None) -> pd.DataFrame:
+        return self.buffers[symbol].to_frame(n_bars)
+
+    def __run(self):
+        if self.__tv is None:
+            self.__tv = TvDatafeed(pooled=True, **self.__tv_kwargs)
+
+        while not self.__stop.is_set():
+            try:
+                for symbol, bar in self.__tv.stream(
+                    self.symbols,
+                    exchange=self.exchange,
+                    interval=self.interval,
+                    n_bars=self.history_bars,
+                    **self.__stream_kwargs,
+                ):
+                    self.buffers[symbol].update(bar)
+                    if self.__stop.is_set():
+                        break
+            except Exception as e:
+                if not self.__stop.is_set():
+                    logger.error(f"stream interrupted: {e}")
+            finally:
+                self.__tv.close()
+
+            if self.__stop.wait(self.reconnect_delay):
+                break
+            self.reconnects += 1
+            logger.debug("resubscribing stream")